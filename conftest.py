@@ -0,0 +1,20 @@
+import shutil
+import tempfile
+
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_cache():
+    """Кеш во временном каталоге, как у ``manage.py test``.
+
+    pytest-django не использует ``TEST_RUNNER``, а тесты очищают кеш
+    и стирали бы кеш запущенного рядом сервера разработки.
+    """
+    from core.testing import clear_caches, isolated_caches
+
+    cache_dir = tempfile.mkdtemp(prefix='yatube_test_cache_')
+    with isolated_caches(cache_dir):
+        clear_caches()
+        yield
+    shutil.rmtree(cache_dir, ignore_errors=True)
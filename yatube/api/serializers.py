@@ -0,0 +1,69 @@
+"""Представление моделей в JSON.
+
+Для каждого ресурса задан словарь «поле -> функция от объекта».
+Клиент может запросить только часть полей параметром ``?fields=``.
+"""
+from posts import counters
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: _isoformat(post.pub_date),
+    'updated_at': lambda post: _isoformat(post.updated_at),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: post.image.url if post.image else None,
+    'thumbnail': lambda post: post.thumbnail_url or None,
+    'comments_count': lambda post: post.comments_count,
+}
+
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'post': lambda comment: comment.post_id,
+    'author': lambda comment: comment.author.username,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: _isoformat(comment.created),
+}
+
+GROUP_FIELDS = {
+    'slug': lambda group: group.slug,
+    'title': lambda group: group.title,
+    'description': lambda group: group.description,
+    'posts_count': lambda group: group.posts_count,
+}
+
+PROFILE_FIELDS = {
+    'username': lambda user: user.username,
+    'full_name': lambda user: user.get_full_name(),
+    'posts_count': lambda user: counters.for_user(user).posts_count,
+    'followers_count': lambda user: counters.for_user(user).followers_count,
+    'following_count': lambda user: counters.for_user(user).following_count,
+}
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def select_fields(available, requested):
+    """Поля из ``?fields=`` в порядке запроса, по умолчанию все."""
+    if not requested:
+        return list(available)
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise FieldsError(
+            'Неизвестные поля: {}. Доступны: {}'.format(
+                ', '.join(unknown), ', '.join(available)
+            )
+        )
+    return names
+
+
+def serialize(obj, available, fields):
+    return {name: available[name](obj) for name in fields}
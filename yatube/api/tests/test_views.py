@@ -0,0 +1,204 @@
+import time
+from http import HTTPStatus
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import caching
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+            for i in range(12)
+        ]
+        cls.posts.reverse()
+        cls.post = cls.posts[0]
+        Comment.objects.create(
+            text='Коммент', author=cls.reader, post=cls.post
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_resources_are_available(self):
+        urls = (
+            reverse('api:post_list'),
+            reverse('api:post_detail', args=(self.post.pk,)),
+            reverse('api:post_comments', args=(self.post.pk,)),
+            reverse('api:group_list'),
+            reverse('api:group_detail', args=(self.group.slug,)),
+            reverse('api:group_posts', args=(self.group.slug,)),
+            reverse('api:profile_detail', args=(self.author.username,)),
+            reverse('api:profile_posts', args=(self.author.username,)),
+            reverse('api:follow_posts'),
+            reverse('api:changes'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.reader_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertTrue(response.has_header('ETag'))
+
+    def test_unknown_resources_return_404(self):
+        urls = (
+            reverse('api:post_detail', args=(0,)),
+            reverse('api:group_posts', args=('unknown',)),
+            reverse('api:profile_detail', args=('unknown',)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_follow_requires_login(self):
+        response = self.client.get(reverse('api:follow_posts'))
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_post_list_is_paginated_by_cursor(self):
+        url = reverse('api:post_list')
+        first = self.client.get(url).json()
+        second = self.client.get(first['next']).json()
+
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(ids, [post.pk for post in self.posts])
+        self.assertIsNone(second['next'])
+        self.assertIsNotNone(second['previous'])
+
+    def test_fields_selects_compact_representation(self):
+        response = self.client.get(
+            reverse('api:post_detail', args=(self.post.pk,)),
+            {'fields': 'id,author'},
+        )
+        self.assertEqual(
+            response.json(), {'id': self.post.pk, 'author': 'author'}
+        )
+
+        first = self.client.get(reverse('api:post_list'), {'fields': 'id'})
+        self.assertIn('fields=id', first.json()['next'])
+
+    def test_unknown_fields_return_400(self):
+        response = self.client.get(
+            reverse('api:post_list'), {'fields': 'id,password'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('password', response.json()['error'])
+
+    def test_unchanged_resource_returns_304(self):
+        url = reverse('api:post_list')
+        etag = self.client.get(url)['ETag']
+
+        # отдельный запрос на агрегат, выборки постов нет
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_last_modified_is_honoured(self):
+        url = reverse('api:post_detail', args=(self.post.pk,))
+        last_modified = self.client.get(url)['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_changes_produce_new_etag(self):
+        changes = (
+            (
+                reverse('api:post_list'),
+                lambda: Post.objects.create(text='Новый', author=self.author),
+            ),
+            (
+                reverse('api:post_detail', args=(self.post.pk,)),
+                lambda: Post.objects.get(pk=self.post.pk).save(),
+            ),
+            (
+                reverse('api:post_comments', args=(self.post.pk,)),
+                lambda: Comment.objects.create(
+                    text='Ещё', author=self.author, post=self.post
+                ),
+            ),
+            (
+                reverse('api:group_detail', args=(self.group.slug,)),
+                lambda: Group.objects.get(pk=self.group.pk).save(),
+            ),
+            (
+                reverse('api:profile_posts', args=(self.author.username,)),
+                lambda: Post.objects.get(pk=self.posts[-1].pk).delete(),
+            ),
+        )
+        for url, change in changes:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                change()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_deleted_post_moves_list_last_modified(self):
+        urls = (
+            reverse('api:post_list'),
+            reverse('api:group_posts', args=(self.group.slug,)),
+            reverse('api:profile_posts', args=(self.author.username,)),
+        )
+        stamps = {url: self.client.get(url)['Last-Modified'] for url in urls}
+        # удаление на минуту позже: Last-Modified с точностью до секунды
+        later = time.time_ns() + 60 * 10**9
+        with mock.patch.object(caching, '_new_version', return_value=later):
+            Post.objects.get(pk=self.posts[-1].pk).delete()
+
+        for url, stamp in stamps.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=stamp)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_follow_posts_rely_on_etag_only(self):
+        response = self.reader_client.get(reverse('api:follow_posts'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+
+class ChangesApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+
+    def test_changes_are_read_incrementally(self):
+        url = reverse('api:changes')
+        since = self.client.get(url).json()['since']
+        post = Post.objects.create(text='Пост', author=self.author)
+        post.save()
+
+        response = self.client.get(url, {'since': since, 'limit': 1}).json()
+        self.assertEqual(
+            [(change['model'], change['id'], change['action'])
+             for change in response['changes']],
+            [('post', post.pk, 'create')],
+        )
+        self.assertTrue(response['has_more'])
+
+        response = self.client.get(url, {'since': response['since']}).json()
+        self.assertEqual(
+            [change['action'] for change in response['changes']], ['update']
+        )
+        self.assertFalse(response['has_more'])
+
+    def test_bad_since_returns_400(self):
+        response = self.client.get(reverse('api:changes'), {'since': 'x'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
@@ -0,0 +1,34 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('v1/posts/', views.post_list, name='post_list'),
+    path('v1/posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'v1/posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments',
+    ),
+    path('v1/groups/', views.group_list, name='group_list'),
+    path('v1/groups/<slug:slug>/', views.group_detail, name='group_detail'),
+    path(
+        'v1/groups/<slug:slug>/posts/',
+        views.group_posts,
+        name='group_posts',
+    ),
+    path(
+        'v1/profiles/<str:username>/',
+        views.profile_detail,
+        name='profile_detail',
+    ),
+    path(
+        'v1/profiles/<str:username>/posts/',
+        views.profile_posts,
+        name='profile_posts',
+    ),
+    path('v1/follow/', views.follow_posts, name='follow_posts'),
+    path('v1/changes/', views.changes, name='changes'),
+]
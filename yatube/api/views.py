@@ -0,0 +1,264 @@
+"""JSON API только для чтения.
+
+Ресурсы отдаются по курсору (``?after=``/``?before=``), набор полей
+задаётся параметром ``?fields=``. Для каждого ресурса валидаторы
+ETag и Last-Modified считаются дешёвыми агрегатами до вызова view,
+поэтому неизменившийся ресурс возвращает 304 без выборки
+и сериализации объектов.
+"""
+from http import HTTPStatus
+
+from core import http, utils
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from posts import caching, changelog, feed, freshness
+from posts.models import Comment, Group, Post, User
+
+from . import serializers
+
+API_VERSION = 'v1'
+
+
+def conditional(validators):
+    """Условный GET с версией API в ETag."""
+    api_conditional = http.conditional(validators, salt=API_VERSION)
+
+    def decorator(view_func):
+        return require_GET(api_conditional(view_func))
+
+    return decorator
+
+
+def error(message, status=HTTPStatus.BAD_REQUEST):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _page_url(request, param, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query.pop(utils.AFTER_PARAM, None)
+    query.pop(utils.BEFORE_PARAM, None)
+    query[param] = cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def detail_response(request, obj, available):
+    try:
+        fields = serializers.select_fields(
+            available, request.GET.get('fields')
+        )
+    except serializers.FieldsError as exc:
+        return error(str(exc))
+    return JsonResponse(serializers.serialize(obj, available, fields))
+
+
+def listing_response(
+    request,
+    items,
+    available,
+    per_page=settings.POSTS_PER_PAGE,
+    keys=('-pub_date', '-pk'),
+):
+    try:
+        fields = serializers.select_fields(
+            available, request.GET.get('fields')
+        )
+    except serializers.FieldsError as exc:
+        return error(str(exc))
+    page = utils.get_page_from_cursor(request, items, per_page, keys)
+    return JsonResponse({
+        'results': [
+            serializers.serialize(obj, available, fields) for obj in page
+        ],
+        'next': _page_url(request, utils.AFTER_PARAM, page.next_cursor),
+        'previous': _page_url(
+            request, utils.BEFORE_PARAM, page.previous_cursor
+        ),
+    })
+
+
+def _posts_validators(request):
+    return freshness.listing_state(caching.INDEX_SCOPE, Post.objects.all())
+
+
+@conditional(_posts_validators)
+def post_list(request):
+    posts = Post.objects.select_related('author', 'group')
+    return listing_response(request, posts, serializers.POST_FIELDS)
+
+
+def _post_validators(request, post_id):
+    row = (
+        Post.objects.filter(pk=post_id)
+        .values_list('updated_at', 'comments_count')
+        .first()
+    )
+    if row is None:
+        raise Http404
+    updated_at, comments_count = row
+    return updated_at, [comments_count, caching.get_generation()]
+
+
+@conditional(_post_validators)
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
+    return detail_response(request, post, serializers.POST_FIELDS)
+
+
+def _comments_validators(request, post_id):
+    row = (
+        Post.objects.filter(pk=post_id)
+        .annotate(last=Max('comments__created'))
+        .values_list('last', 'comments_count')
+        .first()
+    )
+    if row is None:
+        raise Http404
+    last, comments_count = row
+    return last, [comments_count]
+
+
+@conditional(_comments_validators)
+def post_comments(request, post_id):
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    )
+    return listing_response(
+        request,
+        comments,
+        serializers.COMMENT_FIELDS,
+        settings.COMMENTS_PER_PAGE,
+        keys=('-created', '-pk'),
+    )
+
+
+def _groups_validators(request):
+    state = Group.objects.aggregate(
+        total=Count('pk'), posts=Sum('posts_count')
+    )
+    return None, [state['total'], state['posts'], caching.get_generation()]
+
+
+@conditional(_groups_validators)
+def group_list(request):
+    groups = Group.objects.order_by('pk')
+    return listing_response(
+        request, groups, serializers.GROUP_FIELDS, keys=('pk',)
+    )
+
+
+def _group_validators(request, slug):
+    posts_count = (
+        Group.objects.filter(slug=slug)
+        .values_list('posts_count', flat=True)
+        .first()
+    )
+    if posts_count is None:
+        raise Http404
+    return None, [posts_count, caching.get_generation()]
+
+
+@conditional(_group_validators)
+def group_detail(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return detail_response(request, group, serializers.GROUP_FIELDS)
+
+
+def _group_posts_validators(request, slug):
+    _, state = _group_validators(request, slug)
+    last, posts_state = freshness.listing_state(
+        caching.group_scope(slug), freshness.group_posts_queryset(slug)
+    )
+    return last, state + posts_state
+
+
+@conditional(_group_posts_validators)
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    posts = group.posts.select_related('author', 'group')
+    return listing_response(request, posts, serializers.POST_FIELDS)
+
+
+def _profile_validators(request, username):
+    row = (
+        User.objects.filter(username=username)
+        .values_list(
+            'first_name',
+            'last_name',
+            'counters__posts_count',
+            'counters__followers_count',
+            'counters__following_count',
+        )
+        .first()
+    )
+    if row is None:
+        raise Http404
+    return None, list(row)
+
+
+@conditional(_profile_validators)
+def profile_detail(request, username):
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username
+    )
+    return detail_response(request, author, serializers.PROFILE_FIELDS)
+
+
+def _profile_posts_validators(request, username):
+    if not User.objects.filter(username=username).exists():
+        raise Http404
+    return freshness.listing_state(
+        caching.profile_scope(username),
+        freshness.author_posts_queryset(username),
+    )
+
+
+@conditional(_profile_posts_validators)
+def profile_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    posts = author.posts.select_related('author', 'group')
+    return listing_response(request, posts, serializers.POST_FIELDS)
+
+
+def _follow_validators(request):
+    if not request.user.is_authenticated:
+        return None
+    last, state = freshness.feed_state(request.user)
+    return last, [request.user.pk, *state, caching.get_generation()]
+
+
+@conditional(_follow_validators)
+def follow_posts(request):
+    if not request.user.is_authenticated:
+        return error('Нужна авторизация', HTTPStatus.UNAUTHORIZED)
+    posts = feed.get_feed(request.user)
+    return listing_response(request, posts, serializers.POST_FIELDS)
+
+
+def _changes_validators(request):
+    return None, [changelog.latest_seq()]
+
+
+@conditional(_changes_validators)
+def changes(request):
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = int(request.GET.get('limit', changelog.CHANGES_LIMIT))
+    except ValueError:
+        return error('since и limit должны быть целыми числами')
+    limit = max(1, min(limit, changelog.CHANGES_LIMIT))
+    # на одну запись больше, чтобы узнать, есть ли продолжение
+    rows = changelog.changes_since(since, limit + 1)
+    page = rows[:limit]
+    return JsonResponse({
+        'changes': [changelog.as_dict(change) for change in page],
+        'since': page[-1].seq if page else since,
+        'has_more': len(rows) > limit,
+    })
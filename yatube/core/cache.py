@@ -0,0 +1,234 @@
+"""Локальный LRU-кеш процесса перед общим кешем Django.
+
+Горячие ключи (версии лент, страницы лент, группы) читаются из памяти
+процесса без похода в общий кеш. Записи локального уровня живут не
+дольше ``LOCAL_CACHE_TIMEOUT`` секунд, а их суммарный размер в
+сериализованном виде ограничен ``LOCAL_CACHE_MAX_BYTES``.
+
+Изменяемые ключи записываются с ``broadcast=True``: это увеличивает
+эпоху в общем кеше и кладёт рядом список изменённых ключей. Процесс,
+заметив новую эпоху, удаляет из памяти только ключи из пропущенных
+списков; весь локальный уровень очищается, если списков больше
+``LOCAL_CACHE_MAX_CHANGES`` или часть из них уже вытеснена. Эпоха
+проверяется раз в запрос (``LocalCacheSyncMiddleware``), вне запросов -
+не чаще раза в ``LOCAL_CACHE_SYNC_INTERVAL`` секунд. Ключи с версией
+в имени не меняются и записываются без рассылки.
+
+Размер локального уровня виден в ``/metrics`` через ``stats()``.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+EPOCH_KEY = 'local-cache:epoch'
+CHANGES_KEY = 'local-cache:changes:{}'
+LOCAL = 'local'
+SHARED = 'shared'
+
+
+class TwoTierCache:
+    def __init__(self, shared):
+        self.shared = shared
+        self.lock = threading.Lock()
+        # ключ -> (срок, размер, pickle), от давно читанных к свежим
+        self.entries = OrderedDict()
+        self.size = 0
+        self.epoch = None
+        self.synced = None
+        self.counts = {
+            (tier, result): 0
+            for tier in (LOCAL, SHARED)
+            for result in ('hit', 'miss')
+        }
+
+    def _count(self, tier, result, number=1):
+        if not number:
+            return
+        with self.lock:
+            self.counts[tier, result] += number
+        metrics.registry.inc(
+            'yatube_cache_tier_requests_total',
+            {'tier': tier, 'result': result},
+            number,
+        )
+
+    def _get_local(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, _, data = entry
+            if expires <= time.monotonic():
+                self._pop(key)
+                return None
+            self.entries.move_to_end(key)
+        return pickle.loads(data)
+
+    def _pop(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
+
+    def set_local(self, key, value, timeout):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > settings.LOCAL_CACHE_MAX_BYTES:
+            return
+        ttl = settings.LOCAL_CACHE_TIMEOUT
+        if timeout is not None:
+            ttl = min(ttl, timeout)
+        with self.lock:
+            if key in self.entries:
+                self._pop(key)
+            self.entries[key] = time.monotonic() + ttl, len(data), data
+            self.size += len(data)
+            while self.size > settings.LOCAL_CACHE_MAX_BYTES:
+                self._pop(next(iter(self.entries)))
+
+    def clear_local(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def sync(self):
+        """Забыть ключи, изменённые другими процессами с прошлой сверки.
+
+        Пропавшая эпоха (общий кеш очищен или вытеснил её) начинается
+        заново со времени в наносекундах и очищает весь локальный
+        уровень.
+        """
+        epoch = self.shared.get(EPOCH_KEY)
+        if epoch is None:
+            self.shared.add(EPOCH_KEY, time.time_ns(), None)
+            epoch = self.shared.get(EPOCH_KEY)
+        if epoch is None or epoch != self.epoch:
+            self._forget_changes(epoch)
+            self.epoch = epoch
+        self.synced = time.monotonic()
+
+    def _forget_changes(self, epoch):
+        behind = 0
+        if epoch is not None and self.epoch is not None:
+            behind = epoch - self.epoch
+        if not 0 < behind <= settings.LOCAL_CACHE_MAX_CHANGES:
+            self.clear_local()
+            return
+        names = [
+            CHANGES_KEY.format(number)
+            for number in range(self.epoch + 1, epoch + 1)
+        ]
+        changes = self.shared.get_many(names)
+        if len(changes) < len(names):
+            self.clear_local()
+            return
+        with self.lock:
+            for keys in changes.values():
+                for key in keys:
+                    if key in self.entries:
+                        self._pop(key)
+
+    def _maybe_sync(self):
+        interval = settings.LOCAL_CACHE_SYNC_INTERVAL
+        if self.synced is None or time.monotonic() - self.synced > interval:
+            self.sync()
+
+    def broadcast(self, keys):
+        """Сообщить всем процессам, что их копии ``keys`` устарели."""
+        # incr атомарен в memcached и locmem; в файловом кеше две
+        # одновременные рассылки изредка получат одну эпоху, и копии
+        # ключей одной из них доживут до LOCAL_CACHE_TIMEOUT
+        try:
+            epoch = self.shared.incr(EPOCH_KEY)
+        except ValueError:
+            self.shared.add(EPOCH_KEY, time.time_ns(), None)
+            epoch = self.shared.incr(EPOCH_KEY)
+        # incr файлового кеша записывает значение со сроком по умолчанию
+        self.shared.touch(EPOCH_KEY, None)
+        # список нужен, пока у кого-то могут жить копии ключей
+        self.shared.set(
+            CHANGES_KEY.format(epoch),
+            list(keys),
+            settings.LOCAL_CACHE_TIMEOUT + settings.LOCAL_CACHE_SYNC_INTERVAL,
+        )
+        self.sync()
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        self._maybe_sync()
+        found = {}
+        for key in keys:
+            value = self._get_local(key)
+            if value is not None:
+                found[key] = value
+        self._count(LOCAL, 'hit', len(found))
+        missing = [key for key in keys if key not in found]
+        self._count(LOCAL, 'miss', len(missing))
+        if not missing:
+            return found
+        shared = self.shared.get_many(missing)
+        self._count(SHARED, 'hit', len(shared))
+        self._count(SHARED, 'miss', len(missing) - len(shared))
+        for key, value in shared.items():
+            self.set_local(key, value, settings.LOCAL_CACHE_TIMEOUT)
+        found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=None, broadcast=False):
+        self.set_many({key: value}, timeout, broadcast)
+
+    def set_many(self, data, timeout=None, broadcast=False):
+        self.shared.set_many(data, timeout)
+        if broadcast:
+            self.broadcast(data)
+        for key, value in data.items():
+            self.set_local(key, value, timeout)
+
+    def get_or_add(self, key, value, timeout=None):
+        """Записать значение, если ключа ещё нет, и вернуть хранимое.
+
+        Новый ключ ни у кого не лежит в памяти, поэтому рассылка
+        не нужна; из двух одновременных записей остаётся первая.
+        """
+        if not self.shared.add(key, value, timeout):
+            stored = self.shared.get(key)
+            if stored is not None:
+                value = stored
+        self.set_local(key, value, timeout)
+        return value
+
+    def stats(self):
+        """Попадания, промахи и доля попаданий по уровням."""
+        with self.lock:
+            counts = dict(self.counts)
+            entries, size = len(self.entries), self.size
+        tiers = {}
+        for tier in (LOCAL, SHARED):
+            hits, misses = counts[tier, 'hit'], counts[tier, 'miss']
+            total = hits + misses
+            tiers[tier] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / total if total else None,
+            }
+        tiers[LOCAL].update(entries=entries, bytes=size)
+        return tiers
+
+
+tiered = TwoTierCache(cache)
+
+
+def _local_gauges():
+    local = tiered.stats()[LOCAL]
+    return [
+        ('yatube_cache_local_entries', None, local['entries']),
+        ('yatube_cache_local_bytes', None, local['bytes']),
+    ]
+
+
+metrics.registry.add_collector(_local_gauges)
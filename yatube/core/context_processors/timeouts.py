@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def timeouts(request):
+    """Сроки жизни фрагментов ``{% cache %}`` из настроек."""
+    return {'post_card_timeout': settings.POST_CARD_TIMEOUT}
@@ -0,0 +1,58 @@
+"""Персональные фрагменты страниц, вставляемые после кеша.
+
+Страница рендерится одинаковой для всех читателей: на месте шапки,
+кнопок подписки и правки и формы комментария тег ``{% personal %}``
+оставляет метку с именем фрагмента и его аргументами. Такое тело
+кешируется одно на всех, а ``PersonalFragmentsMiddleware`` заменяет
+метки фрагментами, отрендеренными для текущего пользователя.
+
+Фрагмент регистрируется функцией ``register``: шаблон и, если нужно,
+функция, которая по запросу и аргументам метки строит контекст.
+"""
+import base64
+import json
+import re
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+FRAGMENTS = {}
+
+# пользовательский текст экранируется, поэтому метку в тело страницы
+# может поставить только шаблон
+MARKER_PREFIX = '<!--personal:'
+MARKER_RE = re.compile(r'<!--personal:(\w+):([\w=-]*)-->')
+
+
+def register(name, template_name, get_context=None):
+    FRAGMENTS[name] = template_name, get_context
+
+
+def marker(name, **kwargs):
+    if name not in FRAGMENTS:
+        raise KeyError(f'Неизвестный персональный фрагмент {name!r}')
+    raw = json.dumps(kwargs, sort_keys=True).encode()
+    encoded = base64.urlsafe_b64encode(raw).decode()
+    return mark_safe(f'<!--personal:{name}:{encoded}-->')
+
+
+def render_fragment(request, name, kwargs):
+    template_name, get_context = FRAGMENTS[name]
+    context = dict(kwargs)
+    if get_context is not None:
+        context.update(get_context(request, **kwargs))
+    return render_to_string(template_name, context, request=request)
+
+
+def stitch(request, content):
+    """Заменить метки в HTML фрагментами для ``request.user``."""
+
+    def replace(match):
+        name, encoded = match.groups()
+        kwargs = json.loads(base64.urlsafe_b64decode(encoded))
+        return render_fragment(request, name, kwargs)
+
+    return MARKER_RE.sub(replace, content)
+
+
+register('header', 'includes/header.html')
@@ -0,0 +1,38 @@
+"""Условные ответы (304 Not Modified) по дешёвым валидаторам."""
+import hashlib
+import json
+
+from django.views.decorators.http import condition
+
+
+def conditional(validators, salt=''):
+    """Отвечать 304, если ресурс не менялся.
+
+    ``validators(request, *args, **kwargs)`` возвращает пару
+    ``(last_modified, state)`` или None, если проверять нечего.
+    ``state`` - JSON-совместимые значения, от которых зависит ответ;
+    из них, адреса запроса и ``salt`` строится ETag. Валидаторы
+    считаются один раз на запрос и до вызова view.
+    """
+
+    def get_validators(request, *args, **kwargs):
+        if not hasattr(request, '_conditional_validators'):
+            request._conditional_validators = validators(
+                request, *args, **kwargs
+            )
+        return request._conditional_validators
+
+    def etag(request, *args, **kwargs):
+        result = get_validators(request, *args, **kwargs)
+        if result is None:
+            return None
+        raw = json.dumps(
+            [salt, request.get_full_path(), *result], default=str
+        )
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        result = get_validators(request, *args, **kwargs)
+        return result[0] if result else None
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -0,0 +1,105 @@
+"""Учёт SQL-запросов и рендеринга шаблонов за время запроса.
+
+``RequestStats`` собирает запросы ко всем базам через
+``connection.execute_wrapper`` (работает и без DEBUG) и время
+рендеринга шаблонов. Повторы одного и того же SQL с разными
+параметрами - признак N+1. View объявляет допустимое число запросов
+декоратором ``query_budget``.
+"""
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.db import connections
+from django.template.backends.django import Template
+
+_local = threading.local()
+
+# точки сохранения появляются только внутри внешней транзакции (в тестах
+# их есть, в autocommit нет), поэтому в число запросов не входят
+SAVEPOINT_SQL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """View выполнил больше запросов, чем объявлено в бюджете."""
+
+
+def query_budget(limit):
+    """Объявить, сколько SQL-запросов допустимо для view."""
+
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+
+    return decorator
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = []
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self._template_depth = 0
+
+    def _record(self, execute, sql, params, many, context):
+        if sql.startswith(SAVEPOINT_SQL):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.sql_time += duration
+            self.queries.append((sql, duration))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def duplicates(self, threshold=2):
+        """SQL, выполненные с разными параметрами не меньше threshold раз."""
+        counts = Counter(sql for sql, _ in self.queries)
+        return {
+            sql: count for sql, count in counts.items() if count >= threshold
+        }
+
+    @contextmanager
+    def collect(self):
+        previous = getattr(_local, 'stats', None)
+        _local.stats = self
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(self._record)
+                    )
+                yield self
+        finally:
+            _local.stats = previous
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, *args, **kwargs):
+        stats = getattr(_local, 'stats', None)
+        if stats is None:
+            return render(self, *args, **kwargs)
+        # вложенный render_to_string уже учтён во внешнем
+        stats._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            stats._template_depth -= 1
+            if not stats._template_depth:
+                stats.template_time += time.perf_counter() - started
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def install_template_timer():
+    if not getattr(Template.render, 'instrumented', False):
+        Template.render = _timed_render(Template.render)
@@ -0,0 +1,230 @@
+"""Метрики приложения в текстовом формате Prometheus.
+
+Каждый процесс копит счётчики и гистограммы в своём ``Registry``.
+Если задан ``METRICS_DIR``, процесс раз в ``METRICS_FLUSH_INTERVAL``
+секунд сохраняет снимок в файл ``metrics_<pid>.json`` этого каталога (pid
+берётся при записи, после fork у каждого воркера свой файл),
+а ``/metrics`` складывает снимки всех процессов (воркеров gunicorn).
+Без каталога отдаются метрики только текущего процесса.
+
+Значения, которые не копятся, а снимаются (размер кеша в памяти),
+отдают функции из ``Registry.add_collector``: они вызываются при каждом
+снимке, а ``/metrics`` складывает их по процессам.
+"""
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# имя -> (тип, описание)
+METRICS = {
+    'yatube_request_duration_seconds': (
+        'histogram',
+        'Время обработки запроса по view',
+    ),
+    'yatube_db_duration_seconds': (
+        'histogram',
+        'Суммарное время SQL-запросов за запрос по view',
+    ),
+    'yatube_db_queries_total': ('counter', 'Число SQL-запросов по view'),
+    'yatube_cache_requests_total': (
+        'counter',
+        'Обращения к кешу страниц-лент: hit, stale (обновляется) и miss',
+    ),
+    'yatube_cache_tier_requests_total': (
+        'counter',
+        'Чтения двухуровневого кеша: память процесса и общий кеш',
+    ),
+    'yatube_thumbnails_total': (
+        'counter',
+        'Подготовка миниатюр: готово, пропущено, ошибка',
+    ),
+    'yatube_cache_local_entries': (
+        'gauge',
+        'Записей в памяти процессов перед общим кешем',
+    ),
+    'yatube_cache_local_bytes': (
+        'gauge',
+        'Размер записей в памяти процессов перед общим кешем, байт',
+    ),
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((labels or {}).items()))
+
+
+class Registry:
+    def __init__(self, directory=None, pid=None):
+        self.directory = directory
+        # без pid файл называется по текущему процессу: реестр модуля
+        # создаётся при импорте, до fork воркеров (gunicorn --preload)
+        self.pid = pid
+        # функции -> [(имя, метки, значение)], см. add_collector
+        self.collectors = []
+        self.reset()
+
+    def reset(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        # (имя, метки) -> [счётчики корзин..., сумма, число]
+        self.histograms = {}
+        self.flushed = 0.0
+
+    def inc(self, name, labels=None, value=1):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.maybe_flush()
+
+    def observe(self, name, value, labels=None):
+        key = _key(name, labels)
+        with self.lock:
+            data = self.histograms.get(key)
+            if data is None:
+                data = self.histograms[key] = [0] * len(DEFAULT_BUCKETS) + [
+                    0.0,
+                    0,
+                ]
+            position = bisect.bisect_left(DEFAULT_BUCKETS, value)
+            if position < len(DEFAULT_BUCKETS):
+                data[position] += 1
+            data[-2] += value
+            data[-1] += 1
+        self.maybe_flush()
+
+    def add_collector(self, collect):
+        """Снимать ``collect()`` в каждый снимок как значения gauge."""
+        self.collectors.append(collect)
+
+    def snapshot(self):
+        gauges = [
+            [name, list(_key(name, labels)[1]), value]
+            for collect in self.collectors
+            for name, labels, value in collect()
+        ]
+        with self.lock:
+            return {
+                'counters': [
+                    [name, list(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    [name, list(labels), list(data)]
+                    for (name, labels), data in self.histograms.items()
+                ],
+                'gauges': gauges,
+            }
+
+    def _path(self):
+        pid = self.pid or os.getpid()
+        return os.path.join(self.directory, f'metrics_{pid}.json')
+
+    def flush(self):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path()
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as target:
+            json.dump(self.snapshot(), target)
+        os.replace(tmp_path, path)
+        self.flushed = time.monotonic()
+
+    def maybe_flush(self):
+        interval = settings.METRICS_FLUSH_INTERVAL
+        if self.directory and time.monotonic() - self.flushed >= interval:
+            self.flush()
+
+    def collect(self):
+        """Снимки всех процессов, сложенные вместе."""
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        pattern = os.path.join(self.directory, 'metrics_*.json')
+        for path in sorted(glob.glob(pattern)):
+            try:
+                with open(path) as source:
+                    snapshots.append(json.load(source))
+            except (OSError, ValueError):
+                # файл другого процесса могут заменять прямо сейчас
+                continue
+        return snapshots
+
+
+def aggregate(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        # gauge процессов складываются так же, как счётчики; в файлах
+        # старых версий их нет
+        for name, labels, value in (
+            snapshot['counters'] + snapshot.get('gauges', [])
+        ):
+            key = _key(name, dict(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, data in snapshot['histograms']:
+            key = _key(name, dict(labels))
+            total = histograms.setdefault(key, [0] * len(data))
+            for position, value in enumerate(data):
+                total[position] += value
+    return counters, histograms
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _histogram_lines(name, labels, data):
+    cumulative = 0
+    for bound, count in zip(DEFAULT_BUCKETS, data):
+        cumulative += count
+        yield f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}'
+    yield f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {data[-1]}'
+    yield f'{name}_sum{_labels(labels)} {data[-2]}'
+    yield f'{name}_count{_labels(labels)} {data[-1]}'
+
+
+def render(snapshots):
+    """Текст в формате экспозиции Prometheus."""
+    counters, histograms = aggregate(snapshots)
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind in ('counter', 'gauge'):
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {value}')
+        else:
+            for (metric, labels), data in sorted(histograms.items()):
+                if metric == name:
+                    lines.extend(_histogram_lines(name, labels, data))
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry(settings.METRICS_DIR)
+
+
+def _reset_in_child():
+    # воркер начинает с нуля, иначе каждый повторял бы счётчики,
+    # накопленные родителем до fork
+    registry.reset()
+
+
+os.register_at_fork(after_in_child=_reset_in_child)
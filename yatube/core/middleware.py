@@ -0,0 +1,171 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+
+from . import fragments, metrics, routers
+from .cache import tiered
+from .instrumentation import (
+    QueryBudgetExceeded,
+    RequestStats,
+    install_template_timer,
+)
+
+logger = logging.getLogger('yatube.queries')
+
+
+class QueryStatsMiddleware:
+    """Число и время SQL-запросов, время шаблонов и повторы запросов.
+
+    Итоги уходят в заголовок ``Server-Timing``, в лог ``yatube.queries``
+    и в атрибут ``response.query_stats``. Превышение бюджета view
+    пишется в лог или, при ``QUERY_BUDGET_RAISE``, прерывает запрос
+    исключением ``QueryBudgetExceeded``. Время запроса и SQL
+    попадают в гистограммы ``core.metrics`` по имени view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_template_timer()
+
+    def __call__(self, request):
+        stats = RequestStats()
+        started = time.perf_counter()
+        with stats.collect():
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        budget = self._get_budget(request)
+        duplicates = stats.duplicates(settings.QUERY_DUPLICATE_THRESHOLD)
+        response.query_stats = stats
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={stats.sql_time * 1000:.1f};desc="{stats.count} SQL"',
+            f'tpl;dur={stats.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        self._log(request, response, stats, total, budget, duplicates)
+        self._observe(request, stats, total)
+        if budget is not None and stats.count > budget:
+            self._over_budget(request, stats, budget)
+        return response
+
+    @staticmethod
+    def _get_budget(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return None
+        return getattr(match.func, 'query_budget', None)
+
+    @staticmethod
+    def _observe(request, stats, total):
+        match = getattr(request, 'resolver_match', None)
+        # без view_name (404 мимо маршрутов) метки не размножаются по путям
+        labels = {'view': match.view_name if match else 'unresolved'}
+        registry = metrics.registry
+        registry.observe('yatube_request_duration_seconds', total, labels)
+        registry.observe('yatube_db_duration_seconds', stats.sql_time, labels)
+        registry.inc('yatube_db_queries_total', labels, stats.count)
+
+    @staticmethod
+    def _log(request, response, stats, total, budget, duplicates):
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': stats.count,
+            'budget': budget,
+            'sql_ms': round(stats.sql_time * 1000, 1),
+            'template_ms': round(stats.template_time * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'duplicates': list(duplicates.values()),
+        }
+        level = logging.WARNING if duplicates else logging.INFO
+        logger.log(level, json.dumps(record), extra={'query_stats': record})
+
+    @staticmethod
+    def _over_budget(request, stats, budget):
+        message = (
+            f'{request.path}: {stats.count} SQL-запросов при бюджете {budget}'
+        )
+        if settings.QUERY_BUDGET_RAISE:
+            queries = '\n'.join(sql for sql, _ in stats.queries)
+            raise QueryBudgetExceeded(f'{message}\n{queries}')
+        logger.warning(message)
+
+
+class ReplicaPinningMiddleware:
+    """Читать из ``default`` после записи, пока догоняют реплики.
+
+    Небезопасные методы сразу работают с ``default``. Если запрос
+    что-то записал, ответ ставит cookie ``REPLICA_PIN_COOKIE`` на
+    ``REPLICA_PIN_SECONDS`` секунд, и следующие запросы этого
+    клиента тоже читают из ``default``: автор видит свой пост сразу.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = (
+            request.method not in self.SAFE_METHODS
+            or settings.REPLICA_PIN_COOKIE in request.COOKIES
+        )
+        with routers.pinned_scope(pinned):
+            response = self.get_response(request)
+            wrote = routers.has_written()
+        if wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class PersonalFragmentsMiddleware:
+    """Вставить персональные фрагменты в общее тело HTML-страницы.
+
+    Стоит после ``AuthenticationMiddleware``: фрагментам нужен
+    ``request.user``. Ответ с фрагментами вошедшего пользователя
+    помечается ``Cache-Control: private``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.status_code != 200
+            or 'text/html' not in response.get('Content-Type', '')
+        ):
+            return response
+        content = response.content.decode(response.charset)
+        if fragments.MARKER_PREFIX not in content:
+            return response
+        response.content = fragments.stitch(request, content)
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = len(response.content)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True)
+        return response
+
+
+class LocalCacheSyncMiddleware:
+    """Раз в запрос сверить эпоху локального кеша с общим кешем."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        tiered.sync()
+        return self.get_response(request)
@@ -0,0 +1,57 @@
+"""Чтение с реплик, запись в основную базу.
+
+Реплики перечислены в ``REPLICA_DATABASES``. Поток, который уже писал,
+до конца запроса читает из ``default``, иначе он мог бы не увидеть
+свою же запись из-за отставания реплики. Между запросами это
+продолжает ``ReplicaPinningMiddleware`` через cookie. Страницы для
+общего кеша собираются из ``default``, пока их версия сменилась меньше
+``REPLICA_PIN_SECONDS`` назад, см. ``posts.caching``.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PRIMARY = 'default'
+
+_state = threading.local()
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+def has_written():
+    return getattr(_state, 'wrote', False)
+
+
+@contextmanager
+def pinned_scope(pinned=False):
+    """Отдельное состояние привязки к ``default`` на время блока."""
+    previous = is_pinned(), has_written()
+    _state.pinned, _state.wrote = pinned, False
+    try:
+        yield
+    finally:
+        _state.pinned, _state.wrote = previous
+
+
+def use_primary():
+    """Читать только из ``default``, например в фоновых задачах."""
+    return pinned_scope(pinned=True)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if is_pinned() or not settings.REPLICA_DATABASES:
+            return PRIMARY
+        return random.choice(settings.REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        _state.pinned = _state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики - копии default, объекты из них можно связывать
+        return True
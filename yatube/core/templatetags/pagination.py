@@ -0,0 +1,12 @@
+from django import template
+
+from core.utils import elided_page_range
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page_obj, on_each_side=3, on_ends=2):
+    return elided_page_range(
+        page_obj.number, page_obj.paginator.num_pages, on_each_side, on_ends
+    )
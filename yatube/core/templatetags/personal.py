@@ -0,0 +1,14 @@
+from django import template
+
+from core import fragments
+
+register = template.Library()
+
+
+@register.simple_tag
+def personal(name, **kwargs):
+    """Метка персонального фрагмента, см. ``core.fragments``."""
+    try:
+        return fragments.marker(name, **kwargs)
+    except KeyError as error:
+        raise template.TemplateSyntaxError(error)
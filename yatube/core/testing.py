@@ -0,0 +1,54 @@
+"""Помощники для тестов: бюджеты запросов, очистка и изоляция кешей."""
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from .cache import tiered
+
+# превышение бюджета запросов роняет запрос и тест
+enforce_query_budgets = override_settings(QUERY_BUDGET_RAISE=True)
+
+
+def isolated_caches(location):
+    """Файловый кеш в каталоге location вместо общего кеша проекта."""
+    return override_settings(CACHES={
+        'default': {
+            'BACKEND': settings.CACHE_BACKENDS['file'],
+            'LOCATION': location,
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    })
+
+
+def clear_caches():
+    """Очистить общий кеш и память процесса перед ним.
+
+    Запросы через тестовый клиент сами замечают очистку общего кеша,
+    а прямые вызовы кешируемых функций - только через
+    ``LOCAL_CACHE_SYNC_INTERVAL``.
+    """
+    cache.clear()
+    tiered.sync()
+
+
+class IsolatedCacheRunner(DiscoverRunner):
+    """Тесты с файловым кешем во временном каталоге этого запуска.
+
+    Тесты очищают кеш, и с общими настройками они стирали бы кеш
+    запущенного рядом сервера разработки.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp(prefix='yatube_test_cache_')
+        self.isolated_caches = isolated_caches(self.cache_dir)
+        self.isolated_caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.isolated_caches.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,189 @@
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.cache import CHANGES_KEY, TwoTierCache
+from posts.models import Post, User
+
+CACHE_DIR = tempfile.mkdtemp()
+
+FILE_CACHES = {
+    'default': {
+        'BACKEND': settings.CACHE_BACKENDS['file'],
+        'LOCATION': CACHE_DIR,
+    }
+}
+
+# Отдельный процесс с теми же настройками кеша. В его базе есть только
+# схема без постов, поэтому страница с постом может прийти только
+# из общего кеша.
+WORKER_SCRIPT = '''
+import json, os, sys
+import django
+from django.conf import settings
+django.setup()
+settings.DATABASES['default']['NAME'] = os.path.join(
+    os.environ['YATUBE_CACHE_LOCATION'], 'empty.sqlite3'
+)
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client
+command, argument = sys.argv[1:]
+if command == 'set':
+    cache.set(argument, 'из другого процесса')
+    print(json.dumps(None))
+elif command == 'get':
+    print(json.dumps(cache.get(argument)))
+else:
+    call_command('migrate', verbosity=0)
+    response = Client().get(argument)
+    print(json.dumps({
+        'status': response.status_code,
+        'content': response.content.decode(),
+    }))
+'''
+
+
+def run_worker(*args):
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE='yatube.settings',
+        YATUBE_CACHE_BACKEND='file',
+        YATUBE_CACHE_LOCATION=CACHE_DIR,
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', WORKER_SCRIPT, *args],
+        cwd=settings.BASE_DIR,
+        env=env,
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    return json.loads(result.stdout.decode().splitlines()[-1])
+
+
+@override_settings(CACHES=FILE_CACHES)
+class SharedCacheTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_value_set_in_other_process_is_visible(self):
+        run_worker('set', 'shared-key')
+        self.assertEqual(cache.get('shared-key'), 'из другого процесса')
+
+    def test_value_set_here_is_visible_in_other_process(self):
+        cache.set('shared-key', 'из этого процесса')
+        self.assertEqual(run_worker('get', 'shared-key'), 'из этого процесса')
+
+    def test_cached_page_is_served_to_other_process(self):
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Общий кеш', author=author)
+        response = self.client.get(reverse('posts:index'))
+
+        worker_response = run_worker('request', reverse('posts:index'))
+
+        self.assertEqual(worker_response['status'], 200)
+        self.assertEqual(
+            worker_response['content'], response.content.decode()
+        )
+
+
+@override_settings(LOCAL_CACHE_SYNC_INTERVAL=60)
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        shared = LocMemCache('two-tier', {})
+        shared.clear()
+        # два воркера с общим кешем
+        self.first = TwoTierCache(shared)
+        self.second = TwoTierCache(shared)
+        # как в начале запроса
+        self.first.sync()
+        self.second.sync()
+
+    def test_second_read_is_served_from_process_memory(self):
+        self.second.set('key', 'значение')
+
+        self.assertEqual(self.first.get('key'), 'значение')
+        self.assertEqual(self.first.get('key'), 'значение')
+
+        stats = self.first.stats()
+        self.assertEqual(stats['local']['hits'], 1)
+        self.assertEqual(stats['local']['misses'], 1)
+        self.assertEqual(stats['shared']['hits'], 1)
+        self.assertEqual(stats['local']['hit_rate'], 0.5)
+
+    def test_broadcast_reaches_other_worker_on_next_sync(self):
+        self.second.set('version', 1)
+        self.assertEqual(self.first.get('version'), 1)
+
+        self.second.set('version', 2, broadcast=True)
+        self.assertEqual(self.first.get('version'), 1)
+        self.first.sync()
+
+        self.assertEqual(self.first.get('version'), 2)
+
+    def test_broadcast_drops_only_changed_keys(self):
+        self.second.set('hot', 'значение')
+        self.second.set('version', 1)
+        self.first.get_many(['hot', 'version'])
+
+        self.second.set('version', 2, broadcast=True)
+        self.first.sync()
+
+        self.assertIn('hot', self.first.entries)
+        self.assertNotIn('version', self.first.entries)
+        self.assertEqual(self.first.get('version'), 2)
+
+    def test_lost_change_list_clears_whole_local_tier(self):
+        self.first.set('hot', 'значение')
+
+        self.second.set('version', 2, broadcast=True)
+        self.second.shared.delete(CHANGES_KEY.format(self.second.epoch))
+        self.first.sync()
+
+        self.assertEqual(self.first.entries, {})
+
+    def test_new_key_does_not_clear_other_workers(self):
+        self.first.set('hot', 'значение')
+
+        self.assertEqual(self.second.get_or_add('page-version', 1), 1)
+        self.first.sync()
+
+        self.assertIn('hot', self.first.entries)
+        self.assertEqual(self.first.get_or_add('page-version', 2), 1)
+
+    def test_values_without_broadcast_stay_local_until_ttl(self):
+        self.first.set('page', 'старая')
+        self.second.set('page', 'новая')
+        self.assertEqual(self.first.get('page'), 'старая')
+
+        with override_settings(LOCAL_CACHE_TIMEOUT=0):
+            self.first.set('page', 'старая')
+            self.second.set('page', 'новая')
+            self.assertEqual(self.first.get('page'), 'новая')
+
+    def test_least_recently_used_entry_is_evicted(self):
+        value = 'x' * 100
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with override_settings(LOCAL_CACHE_MAX_BYTES=size * 2):
+            self.first.set('a', value)
+            self.first.set('b', value)
+            self.first.get('a')
+            self.first.set('c', value)
+
+        self.assertEqual(set(self.first.entries), {'a', 'c'})
+        self.assertEqual(self.first.stats()['local']['bytes'], size * 2)
@@ -0,0 +1,110 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from core import cache as cache_module
+from core import metrics
+from core.cache import tiered
+from posts.models import Post, User
+
+
+class RegistryTests(TestCase):
+    def test_histogram_is_cumulative_in_text_format(self):
+        registry = metrics.Registry()
+        labels = {'view': 'posts:index'}
+        registry.observe('yatube_request_duration_seconds', 0.003, labels)
+        registry.observe('yatube_request_duration_seconds', 0.2, labels)
+        registry.observe('yatube_request_duration_seconds', 30, labels)
+        text = metrics.render(registry.collect())
+        prefix = 'yatube_request_duration_seconds'
+        self.assertIn(
+            '# TYPE yatube_request_duration_seconds histogram', text
+        )
+        self.assertIn(f'{prefix}_bucket{{view="posts:index",le="0.005"}} 1',
+                      text)
+        self.assertIn(f'{prefix}_bucket{{view="posts:index",le="0.25"}} 2',
+                      text)
+        self.assertIn(f'{prefix}_bucket{{view="posts:index",le="+Inf"}} 3',
+                      text)
+        self.assertIn(f'{prefix}_count{{view="posts:index"}} 3', text)
+
+    def test_workers_are_summed_through_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = metrics.Registry(directory, pid=1)
+            second = metrics.Registry(directory, pid=2)
+            labels = {'scope': 'index_page', 'result': 'hit'}
+            first.inc('yatube_cache_requests_total', labels, 2)
+            second.inc('yatube_cache_requests_total', labels, 3)
+            first.flush()
+            text = metrics.render(second.collect())
+        self.assertIn(
+            'yatube_cache_requests_total'
+            '{result="hit",scope="index_page"} 5',
+            text,
+        )
+
+    def test_local_cache_size_is_summed_as_gauge(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = metrics.Registry(directory, pid=1)
+            second = metrics.Registry(directory, pid=2)
+            first.add_collector(cache_module._local_gauges)
+            second.add_collector(cache_module._local_gauges)
+            tiered.set_local('key', 'значение', None)
+            first.flush()
+            text = metrics.render(second.collect())
+        entries = tiered.stats()['local']['entries']
+        self.assertIn('# TYPE yatube_cache_local_entries gauge', text)
+        self.assertIn(f'yatube_cache_local_entries {entries * 2}', text)
+
+    def test_forked_worker_writes_its_own_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            registry = metrics.Registry(directory)
+            child = os.fork()
+            if child == 0:
+                registry.flush()
+                os._exit(0)
+            os.waitpid(child, 0)
+            self.assertTrue(
+                os.path.exists(
+                    os.path.join(directory, f'metrics_{child}.json')
+                )
+            )
+
+    def test_fork_resets_inherited_counters(self):
+        with mock.patch.object(metrics, 'registry', metrics.Registry()):
+            metrics.registry.inc('yatube_thumbnails_total')
+            metrics._reset_in_child()
+            self.assertEqual(metrics.registry.snapshot()['counters'], [])
+
+
+class MetricsViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='author')
+        Post.objects.create(text='Пост', author=user)
+        self.registry = metrics.Registry()
+        patcher = mock.patch.object(metrics, 'registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_index_latency_and_cache_hits_are_exposed(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        response = self.client.get('/metrics')
+        text = response.content.decode()
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            text,
+        )
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', text)
+        for result in ('hit', 'miss'):
+            self.assertIn(
+                'yatube_cache_requests_total'
+                f'{{result="{result}",scope="index_page"}} 1',
+                text,
+            )
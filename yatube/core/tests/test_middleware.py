@@ -0,0 +1,65 @@
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import path
+
+from core.instrumentation import QueryBudgetExceeded, query_budget
+from core.testing import enforce_query_budgets
+from posts.models import Post, User
+
+
+def n_plus_one(request):
+    posts = Post.objects.all()
+    names = [post.author.username for post in posts]
+    return HttpResponse(', '.join(names))
+
+
+@query_budget(1)
+def over_budget(request):
+    list(Post.objects.all())
+    list(User.objects.all())
+    return HttpResponse('ok')
+
+
+urlpatterns = [
+    path('n-plus-one/', n_plus_one),
+    path('over-budget/', over_budget),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__, QUERY_DUPLICATE_THRESHOLD=3)
+class QueryStatsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            author = User.objects.create_user(username=f'author{i}')
+            Post.objects.create(text='Пост', author=author)
+
+    def test_server_timing_reports_queries(self):
+        with self.assertLogs('yatube.queries', 'WARNING'):
+            response = self.client.get('/n-plus-one/')
+
+        self.assertEqual(response.query_stats.count, 4)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="4 SQL"', response['Server-Timing'])
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    def test_repeated_queries_are_logged_as_n_plus_one(self):
+        with self.assertLogs('yatube.queries', 'WARNING') as logs:
+            response = self.client.get('/n-plus-one/')
+
+        self.assertEqual(
+            list(response.query_stats.duplicates(3).values()), [3]
+        )
+        self.assertIn('"duplicates": [3]', logs.output[0])
+
+    def test_over_budget_is_logged(self):
+        with self.assertLogs('yatube.queries', 'WARNING') as logs:
+            self.client.get('/over-budget/')
+
+        self.assertIn('2 SQL-запросов при бюджете 1', logs.output[-1])
+
+    @enforce_query_budgets
+    def test_over_budget_fails_when_enforced(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/over-budget/')
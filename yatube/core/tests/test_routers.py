@@ -0,0 +1,106 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import routers
+from posts.models import Post, User
+
+# Отдельный процесс с двумя файлами SQLite: primary.sqlite3 и
+# replica.sqlite3. Репликации нет, поэтому реплика навсегда "отстаёт",
+# и по ответам видно, из какой базы читал каждый запрос.
+WORKER_SCRIPT = '''
+import json
+import django
+django.setup()
+from django.core.management import call_command
+from django.test import Client
+from posts.models import Post, User
+for alias in ('default', 'replica1'):
+    call_command('migrate', database=alias, verbosity=0)
+author = User.objects.create_user(username='author')
+author_client = Client()
+author_client.force_login(author)
+created = author_client.post('/create/', {'text': 'Свежий пост'})
+post = Post.objects.using('default').get()
+profile = '/profile/author/'
+reader = Client()
+print(json.dumps({
+    'pin_cookie': created.cookies['primary_pin']['max-age'],
+    'reader_status': reader.get(f'/posts/{post.pk}/').status_code,
+    'reader_listing_has_post': 'Свежий пост' in reader.get(
+        profile
+    ).content.decode(),
+    'author_sees_post': 'Свежий пост' in author_client.get(
+        profile
+    ).content.decode(),
+}))
+'''
+
+
+class ReplicaRouterTests(TestCase):
+    @override_settings(REPLICA_DATABASES=['replica1'])
+    def test_reads_go_to_replica_until_write(self):
+        router = routers.ReplicaRouter()
+        with routers.pinned_scope():
+            self.assertEqual(router.db_for_read(Post), 'replica1')
+            self.assertEqual(router.db_for_write(Post), 'default')
+            self.assertEqual(router.db_for_read(Post), 'default')
+            self.assertTrue(routers.has_written())
+
+    def test_without_replicas_reads_from_default(self):
+        router = routers.ReplicaRouter()
+        with routers.pinned_scope():
+            self.assertEqual(router.db_for_read(Post), 'default')
+
+
+class ReplicaPinningMiddlewareTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(text='Пост', author=self.user)
+        self.client.force_login(self.user)
+
+    def test_write_sets_pin_cookie(self):
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Комментарий'},
+        )
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+
+    def test_read_does_not_set_pin_cookie(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+
+class TwoDatabasesTests(TestCase):
+    def test_author_reads_own_write_while_replica_lags(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                DJANGO_SETTINGS_MODULE='yatube.settings',
+                YATUBE_CACHE_BACKEND='locmem',
+                YATUBE_DB_PATH=os.path.join(directory, 'primary.sqlite3'),
+                YATUBE_DB_REPLICAS=os.path.join(directory, 'replica.sqlite3'),
+            )
+            result = subprocess.run(
+                [sys.executable, '-c', WORKER_SCRIPT],
+                cwd=settings.BASE_DIR,
+                env=env,
+                stdout=subprocess.PIPE,
+                # 404 читателя пишется в лог, в выводе тестов он не нужен
+                stderr=subprocess.PIPE,
+                check=True,
+            )
+        state = json.loads(result.stdout.decode().splitlines()[-1])
+        self.assertEqual(state['pin_cookie'], settings.REPLICA_PIN_SECONDS)
+        self.assertTrue(state['author_sees_post'])
+        # в реплике нет даже поста
+        self.assertEqual(state['reader_status'], 404)
+        # страница, которая попадёт в общий кеш, читается из default
+        self.assertTrue(state['reader_listing_has_post'])
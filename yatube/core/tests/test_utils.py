@@ -0,0 +1,39 @@
+from django.core.paginator import Paginator
+from django.template import Context, Template
+from django.test import SimpleTestCase
+
+from core.utils import elided_page_range
+
+
+class ElidedPageRangeTests(SimpleTestCase):
+    def test_few_pages_are_all_shown(self):
+        self.assertEqual(elided_page_range(2, 5), [1, 2, 3, 4, 5])
+
+    def test_pages_far_from_current_are_elided(self):
+        self.assertEqual(
+            elided_page_range(50, 100_000, on_each_side=2, on_ends=1),
+            [1, None, 48, 49, 50, 51, 52, None, 100_000],
+        )
+
+    def test_single_skipped_page_is_shown(self):
+        self.assertEqual(
+            elided_page_range(4, 10, on_each_side=1, on_ends=1),
+            [1, 2, 3, 4, 5, None, 10],
+        )
+
+    def test_window_size_does_not_depend_on_page_count(self):
+        self.assertEqual(
+            len(elided_page_range(5000, 10_000)),
+            len(elided_page_range(500_000, 1_000_000)),
+        )
+
+
+class PageWindowTagTests(SimpleTestCase):
+    def test_tag_renders_window_of_current_page(self):
+        page_obj = Paginator(range(1000), 10).page(50)
+        rendered = Template(
+            '{% load pagination %}'
+            '{% page_window page_obj 1 1 as pages %}'
+            '{% for i in pages %}{{ i|default:"…" }} {% endfor %}'
+        ).render(Context({'page_obj': page_obj}))
+        self.assertEqual(rendered, '1 … 49 50 51 … 100 ')
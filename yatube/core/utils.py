@@ -1,11 +1,230 @@
+import base64
+import binascii
+import json
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db import DatabaseError, connections, router
+from django.db.models import Q
+
+PAGE_MODE = 'page'
+CURSOR_MODE = 'cursor'
+
+AFTER_PARAM = 'after'
+BEFORE_PARAM = 'before'
+
+
+def _cursor_default(value):
+    # DjangoJSONEncoder обрезает микросекунды, а курсору нужна точность
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetPage(Page):
+    """Страница курсорной пагинации.
+
+    Номера страницы нет: вместо него есть непрозрачные токены
+    ``next_cursor`` и ``previous_cursor`` для параметров ``?after=``
+    и ``?before=``.
+    """
+
+    is_keyset = True
+
+    def __init__(
+        self, object_list, paginator, next_cursor=None, previous_cursor=None
+    ):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Keyset page>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу сортировки вместо OFFSET.
+
+    Страница выбирается условием ``WHERE (pub_date, id) < (...)``,
+    поэтому любая страница стоит столько же, сколько первая,
+    и запрос ``COUNT(*)`` не нужен. Все поля ``keys`` сортируются
+    в одном направлении, последнее поле должно быть уникальным.
+    """
+
+    def __init__(self, object_list, per_page, keys=('-pub_date', '-pk')):
+        super().__init__(object_list, per_page)
+        self.keys = keys
+        self.descending = keys[0].startswith('-')
+        self.fields = [key.lstrip('-') for key in keys]
+
+    def _get_field(self, name):
+        opts = self.object_list.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, name) for name in self.fields]
+        raw = json.dumps(values, default=_cursor_default).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Вернуть значения ключа из токена или None, если он испорчен."""
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw.decode())
+            if len(values) != len(self.fields):
+                return None
+            return [
+                self._get_field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (
+            binascii.Error,
+            TypeError,
+            UnicodeDecodeError,
+            ValidationError,
+            ValueError,
+        ):
+            return None
+
+    def _seek(self, values, forward):
+        """Условие «строго после values» в направлении обхода."""
+        lookup = 'lt' if self.descending == forward else 'gt'
+        condition = Q()
+        for position, name in enumerate(self.fields):
+            step = Q(**{f'{name}__{lookup}': values[position]})
+            for previous, value in zip(self.fields, values[:position]):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def _ordering(self, forward):
+        if forward:
+            return self.keys
+        return [
+            key.lstrip('-') if key.startswith('-') else f'-{key}'
+            for key in self.keys
+        ]
+
+    def get_keyset_page(self, after=None, before=None):
+        after_values = self.decode_cursor(after)
+        before_values = self.decode_cursor(before)
+        forward = before_values is None
+        items = self.object_list.order_by(*self._ordering(forward))
+        if after_values is not None and forward:
+            items = items.filter(self._seek(after_values, forward=True))
+        if not forward:
+            items = items.filter(self._seek(before_values, forward=False))
+
+        rows = list(items[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        if forward:
+            has_next = has_more
+            has_previous = after_values is not None and bool(rows)
+        else:
+            has_next = bool(rows)
+            has_previous = has_more
+
+        next_cursor = self.encode_cursor(rows[-1]) if has_next else None
+        previous_cursor = self.encode_cursor(rows[0]) if has_previous else None
+        return KeysetPage(rows, self, next_cursor, previous_cursor)
+
+
+def estimate_rows(model):
+    """Число строк таблицы по статистике СУБД или None.
+
+    Статистику собирают ``ANALYZE`` (SQLite, PostgreSQL) и autovacuum,
+    она отстаёт от данных, зато не читает таблицу.
+    """
+    connection = connections[router.db_for_read(model)]
+    table = model._meta.db_table
+    queries = {
+        'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+        'postgresql': (
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+        ),
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(queries[connection.vendor], [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # sqlite_stat1 появляется только после первого ANALYZE
+        return None
+    if row is None:
+        return None
+    # в SQLite первое число stat - строки таблицы, PostgreSQL
+    # возвращает -1 для ещё не проанализированной таблицы
+    rows = int(str(row[0]).split()[0])
+    return rows if rows >= 0 else None
+
+
+def elided_page_range(number, num_pages, on_each_side=3, on_ends=2):
+    """Номера страниц для пагинатора с пропусками.
+
+    Первые и последние ``on_ends`` страниц и по ``on_each_side`` вокруг
+    текущей, вместо остальных ``None``. Длина списка не зависит от
+    ``num_pages``. Пропуск ровно одной страницы заменяется её номером.
+    """
+    pages = set(range(1, min(on_ends, num_pages) + 1))
+    pages.update(range(max(num_pages - on_ends + 1, 1), num_pages + 1))
+    pages.update(range(
+        max(number - on_each_side, 1),
+        min(number + on_each_side, num_pages) + 1,
+    ))
+    result = []
+    for page in sorted(pages):
+        if result and page - result[-1] == 2:
+            result.append(page - 1)
+        elif result and page - result[-1] > 2:
+            result.append(None)
+        result.append(page)
+    return result
+
+
+def get_page_from_cursor(
+    request,
+    items,
+    posts_per_page=settings.POSTS_PER_PAGE,
+    keys=('-pub_date', '-pk'),
+):
+    paginator = KeysetPaginator(items, posts_per_page, keys)
+    return paginator.get_keyset_page(
+        after=request.GET.get(AFTER_PARAM),
+        before=request.GET.get(BEFORE_PARAM),
+    )
 
 
 def get_page_from_paginator(
-    request, items, posts_per_page=settings.POSTS_PER_PAGE
+    request,
+    items,
+    posts_per_page=settings.POSTS_PER_PAGE,
+    mode=None,
+    count=None,
 ):
+    if (mode or settings.PAGINATION_MODE) == CURSOR_MODE:
+        return get_page_from_cursor(request, items, posts_per_page)
     paginator = Paginator(items, posts_per_page)
+    if count is not None:
+        # известное заранее число объектов избавляет от COUNT(*)
+        paginator.count = count
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    # номер за пределами ленты даёт последнюю страницу, кешу нужно
+    # знать, какая страница показана на самом деле
+    request.resolved_page = page_obj.number
     return page_obj
@@ -1,4 +1,8 @@
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_GET
+
+from . import metrics
 
 
 def page_not_found(request, exception):
@@ -15,3 +19,12 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@require_GET
+def metrics_view(request):
+    """Метрики всех воркеров в текстовом формате Prometheus."""
+    return HttpResponse(
+        metrics.render(metrics.registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Follow, Group, Post
 
 
@@ -25,6 +26,13 @@ class PostAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
     list_editable = ('group',)
 
+    def get_search_results(self, request, queryset, search_term):
+        # поиск по обратному индексу вместо LIKE по всем текстам
+        if not search_term:
+            return queryset, False
+        found = search.search(search_term).values('pk')
+        return queryset.filter(pk__in=found), False
+
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'author')
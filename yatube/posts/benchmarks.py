@@ -0,0 +1,231 @@
+"""Нагрузочные замеры страниц постов.
+
+``seed()`` заполняет базу реалистичным объёмом данных: тексты
+генерирует Faker, вставка идёт через ``importing.Importer`` порциями
+``bulk_create``. ``run()`` прогоняет сценарии через тестовый клиент
+и для каждого считает задержку (p50/p99), число запросов к базе
+и пиковую память на запрос.
+"""
+import random
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from faker import Faker
+
+from . import importing
+from .models import Follow, Group, Post, User
+
+BENCH_PASSWORD = 'bench-password'
+
+
+def _user_rows(users):
+    for i in range(users):
+        yield f'bench_user_{i}'
+
+
+def _group_rows(fake, groups):
+    for i in range(groups):
+        yield {
+            'slug': f'bench-group-{i}',
+            'title': fake.sentence(nb_words=3)[:200],
+            'description': fake.paragraph(),
+        }
+
+
+def _post_rows(fake, rand, users, groups, posts):
+    for i in range(posts):
+        group = rand.randrange(groups + 1)
+        yield {
+            'id': i + 1,
+            'text': fake.paragraph(nb_sentences=rand.randint(1, 6)),
+            'pub_date': fake.date_time_between('-2y').isoformat(),
+            'author__username': f'bench_user_{rand.randrange(users)}',
+            'group__slug': f'bench-group-{group}' if group < groups else '',
+        }
+
+
+def _comment_rows(fake, rand, users, posts, comments):
+    for _ in range(comments):
+        yield {
+            'post_id': rand.randint(1, posts),
+            'author__username': f'bench_user_{rand.randrange(users)}',
+            'text': fake.sentence(),
+        }
+
+
+def _follow_rows(rand, users, follows_per_user):
+    # степенное распределение: у немногих авторов много подписчиков
+    for i in range(users):
+        for _ in range(follows_per_user):
+            author = int(users * rand.random() ** 3)
+            yield {
+                'user__username': f'bench_user_{i}',
+                'author__username': f'bench_user_{author}',
+            }
+
+
+def seed(
+    users=1000,
+    groups=50,
+    posts=20000,
+    comments=20000,
+    follows_per_user=20,
+    batch_size=2000,
+    seed_value=0,
+):
+    """Заполнить базу данными для замеров, вернуть объёмы по таблицам."""
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed_value)
+    rand = random.Random(seed_value)
+    importer = importing.Importer(batch_size=batch_size)
+    importer.import_users(_user_rows(users))
+    bench_user = User.objects.get(username='bench_user_0')
+    bench_user.set_password(BENCH_PASSWORD)
+    bench_user.save()
+    importer.import_groups(_group_rows(fake, groups))
+    importer.import_posts(_post_rows(fake, rand, users, groups, posts))
+    importer.import_comments(
+        _comment_rows(fake, rand, users, posts, comments)
+    )
+    importer.import_follows(_follow_rows(rand, users, follows_per_user))
+    importer.finish()
+    return dict(importer.imported, users=users)
+
+
+def percentile(values, share):
+    """Процентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(share * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class Scenario:
+    """Запрос сценария; ``prepare`` выбирает адрес и данные заново."""
+
+    def __init__(self, name, prepare, method='get'):
+        self.name = name
+        self.prepare = prepare
+        self.method = method
+
+    def request(self, client):
+        url, data = self.prepare()
+        return getattr(client, self.method)(url, data)
+
+
+def scenarios(rand):
+    post_ids = list(Post.objects.values_list('pk', flat=True)[:10000])
+    slugs = list(Group.objects.values_list('slug', flat=True))
+    usernames = list(
+        Follow.objects.values_list('author__username', flat=True)
+        .distinct()[:1000]
+    )
+
+    def page():
+        return {'page': rand.randint(1, 20)}
+
+    return [
+        Scenario('index', lambda: (reverse('posts:index'), page())),
+        Scenario(
+            'group_posts',
+            lambda: (
+                reverse('posts:group_list', args=(rand.choice(slugs),)),
+                page(),
+            ),
+        ),
+        Scenario(
+            'profile',
+            lambda: (
+                reverse('posts:profile', args=(rand.choice(usernames),)),
+                page(),
+            ),
+        ),
+        Scenario(
+            'post_detail',
+            lambda: (
+                reverse('posts:post_detail', args=(rand.choice(post_ids),)),
+                {},
+            ),
+        ),
+        Scenario(
+            'follow_index', lambda: (reverse('posts:follow_index'), page())
+        ),
+        Scenario(
+            'post_create',
+            lambda: (
+                reverse('posts:post_create'),
+                {'text': f'Замер {rand.random()}'},
+            ),
+            method='post',
+        ),
+        Scenario(
+            'add_comment',
+            lambda: (
+                reverse('posts:add_comment', args=(rand.choice(post_ids),)),
+                {'text': f'Замер {rand.random()}'},
+            ),
+            method='post',
+        ),
+    ]
+
+
+def _peak_memory(scenario, client, samples):
+    peaks = []
+    for _ in range(samples):
+        tracemalloc.start()
+        try:
+            scenario.request(client)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return max(peaks)
+
+
+def measure(scenario, client, iterations, warmup=5, cold=False):
+    for _ in range(warmup):
+        scenario.request(client)
+    timings, queries = [], []
+    for _ in range(iterations):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = scenario.request(client)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(
+                f'{scenario.name}: ответ {response.status_code}'
+            )
+        queries.append(len(captured))
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+        'peak_memory_kb': round(
+            _peak_memory(scenario, client, min(iterations, 5)) / 1024, 1
+        ),
+    }
+
+
+def run(iterations=100, names=None, cold=False, seed_value=0):
+    """Прогнать сценарии, вернуть результаты по именам."""
+    rand = random.Random(seed_value)
+    client = Client()
+    if not client.login(username='bench_user_0', password=BENCH_PASSWORD):
+        raise RuntimeError('Нет данных для замеров, сначала вызовите seed()')
+    results = {}
+    for scenario in scenarios(rand):
+        if names and scenario.name not in names:
+            continue
+        results[scenario.name] = measure(
+            scenario, client, iterations, cold=cold
+        )
+    return results
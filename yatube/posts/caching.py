@@ -0,0 +1,410 @@
+"""Кеш страниц-лент с версионными ключами.
+
+Ключ закешированной страницы содержит три версии: общее поколение
+(меняется при правке сообществ), версию ленты (меняется при появлении
+и удалении постов) и версию конкретной страницы (меняется при правке
+поста, который на ней показан). Смена версии делает старые ключи
+недостижимыми, поэтому срок жизни записей может быть долгим.
+
+Истёкшая по времени страница ещё ``LISTING_STALE_TIMEOUT`` секунд
+отдаётся как есть, пока один запрос, взявший блокировку в кеше,
+обновляет её в фоне. Чтобы истечение не совпадало у всех воркеров,
+запись считается устаревшей чуть раньше срока с вероятностью, растущей
+к концу срока и со временем пересчёта (XFetch).
+"""
+import hashlib
+import logging
+import math
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.test import RequestFactory
+
+from core import metrics, routers, utils
+from core.cache import tiered
+
+from .models import Group, Post
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'listing:generation'
+UNCHANGED = object()
+INDEX_SCOPE = 'index_page'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def profile_scope(username):
+    return f'profile:{username}'
+
+
+def feed_scope(user_id):
+    return f'feed:{user_id}'
+
+
+def _scope_key(scope):
+    return f'listing:version:{scope}'
+
+
+def _page_key(scope, page):
+    return f'listing:version:{scope}:page:{page}'
+
+
+def _new_version():
+    # версия из часов не повторится, даже если ключ был вытеснен из кеша
+    return time.time_ns()
+
+
+def _bump(*keys):
+    version = _new_version()
+    tiered.set_many(
+        {key: version for key in keys},
+        settings.LISTING_VERSION_TIMEOUT,
+        broadcast=True,
+    )
+
+
+def _get_versions(*keys):
+    # версии читаются на каждый запрос, поэтому лежат и в памяти
+    # процесса; рассылается только их смена в _bump
+    versions = tiered.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = tiered.get_or_add(
+                key, _new_version(), settings.LISTING_VERSION_TIMEOUT
+            )
+    return [versions[key] for key in keys]
+
+
+def get_generation():
+    """Текущее поколение кеша, меняется при правке сообществ."""
+    return _get_versions(GENERATION_KEY)[0]
+
+
+def get_page_id(request):
+    """Номер страницы для ключа или None для неканонического номера.
+
+    ``?page=0``, ``?page=007`` или мусор показывают другую страницу,
+    чем записано в параметре, и такие копии не сбрасывались бы
+    правкой поста, поэтому они не кешируются.
+    """
+    if settings.PAGINATION_MODE == 'cursor':
+        return 'cursor'
+    page = request.GET.get('page', '1')
+    if page.isdigit() and not page.startswith('0'):
+        return page
+    return None
+
+
+def get_key_prefix(scope, request):
+    page = get_page_id(request)
+    generation, scope_version, page_version = _get_versions(
+        GENERATION_KEY, _scope_key(scope), _page_key(scope, page)
+    )
+    return f'{scope}.{generation}.{scope_version}.{page}.{page_version}'
+
+
+def get_scope_versions(scope):
+    """Поколение и версия ленты: меняются при появлении и удалении
+    постов в ней и при правке сообществ."""
+    return _get_versions(GENERATION_KEY, _scope_key(scope))
+
+
+def get_listing_count(scope, items, timeout=None):
+    """Число объектов ленты без ``COUNT(*)`` на каждый запрос.
+
+    Ключ включает поколение и версию ленты, поэтому новый или удалённый
+    пост сбрасывает число вместе со страницами. В режиме
+    ``LISTING_COUNT_MODE = 'approximate'`` число берётся из статистики
+    таблицы, если она есть, и ограничивается ``LISTING_MAX_PAGES``
+    страницами.
+    """
+    approximate = settings.LISTING_COUNT_MODE == 'approximate'
+    if approximate and not items.query.where:
+        count = utils.estimate_rows(items.model)
+        if count is not None:
+            return _cap(count)
+    generation, version = get_scope_versions(scope)
+    key = f'listing:count:{scope}.{generation}.{version}'
+    count = tiered.get(key)
+    if count is None:
+        count = items.count()
+        tiered.set(key, count, timeout or settings.LISTING_CACHE_TIMEOUT)
+    return limit_count(count)
+
+
+def limit_count(count):
+    """Число для пагинатора: в режиме ``'approximate'`` не больше
+    ``LISTING_MAX_PAGES`` страниц, как у ``get_listing_count``."""
+    if settings.LISTING_COUNT_MODE == 'approximate':
+        return _cap(count)
+    return count
+
+
+def _cap(count):
+    return min(count, settings.LISTING_MAX_PAGES * settings.POSTS_PER_PAGE)
+
+
+def get_group(slug):
+    """Группа по slug или None.
+
+    Ключ меняется с поколением и версией ленты группы, поэтому
+    счётчик постов в закешированной группе не отстаёт от ленты.
+    """
+    generation, version = get_scope_versions(group_scope(slug))
+    key = f'group:{slug}.{generation}.{version}'
+    group = tiered.get(key)
+    if group is None:
+        group = Group.objects.filter(slug=slug).first()
+        if group is not None:
+            tiered.set(key, group, settings.LISTING_CACHE_TIMEOUT)
+    return group
+
+
+def invalidate_all():
+    _bump(GENERATION_KEY)
+
+
+def invalidate_scopes(*scopes):
+    _bump(*(_scope_key(scope) for scope in scopes))
+
+
+def invalidate_pages(scope, pages):
+    _bump(*(_page_key(scope, page) for page in pages))
+
+
+def _post_listings(post, group_slug):
+    """Ленты, в которых показан пост, и их querysets."""
+    listings = {
+        INDEX_SCOPE: Post.objects.all(),
+        profile_scope(post.author.username): Post.objects.filter(
+            author_id=post.author_id
+        ),
+    }
+    if group_slug:
+        listings[group_scope(group_slug)] = Post.objects.filter(
+            group__slug=group_slug
+        )
+    return listings
+
+
+def _get_post_pages(post, posts):
+    """Номера страниц, на которых может оказаться пост."""
+    if settings.PAGINATION_MODE == 'cursor':
+        return ['cursor']
+    per_page = settings.POSTS_PER_PAGE
+    newer = posts.filter(pub_date__gt=post.pub_date).count()
+    up_to = posts.filter(pub_date__gte=post.pub_date).count()
+    first, last = newer // per_page, max(up_to - 1, newer) // per_page
+    return [str(page + 1) for page in range(first, last + 1)]
+
+
+def invalidate_post(post, changed_listings=True, old_group_slug=UNCHANGED):
+    """Сбросить закешированные страницы с постом.
+
+    Новый или удалённый пост сдвигает все страницы ленты, поэтому
+    меняется версия ленты целиком. Правка поста на месте затрагивает
+    только страницы, где он показан.
+    """
+    group_slug = post.group.slug if post.group_id else None
+    listings = _post_listings(post, group_slug)
+    if old_group_slug is not UNCHANGED and old_group_slug != group_slug:
+        changed_listings = True
+        if old_group_slug:
+            invalidate_scopes(group_scope(old_group_slug))
+    if changed_listings:
+        invalidate_scopes(*listings)
+        return
+    for scope, posts in listings.items():
+        invalidate_pages(scope, _get_post_pages(post, posts))
+
+
+# фоновые обновления устаревших страниц
+refresher = ThreadPoolExecutor(
+    max_workers=settings.LISTING_REFRESH_WORKERS,
+    thread_name_prefix='listing-refresh',
+)
+
+
+def _entry_key(name, request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'listing:page:{get_key_prefix(name, request)}:{path}'
+
+
+def _is_fresh(expires, delta):
+    # XFetch: -log(random()) > 0, ранний пересчёт тем вероятнее,
+    # чем ближе срок и чем дольше считается страница
+    beta = settings.LISTING_EARLY_EXPIRY_BETA
+    early = delta * beta * -math.log(1.0 - random.random())
+    return time.time() + early < expires
+
+
+def _is_recently_changed(scope, request):
+    """Версии страницы сменились меньше ``REPLICA_PIN_SECONDS`` назад.
+
+    Версия - время смены, и реплика в это окно могла ещё не получить
+    запись, из-за которой версия сменилась.
+    """
+    page = get_page_id(request)
+    changed = max(_get_versions(
+        GENERATION_KEY, _scope_key(scope), _page_key(scope, page)
+    ))
+    return time.time_ns() - changed < settings.REPLICA_PIN_SECONDS * 10**9
+
+
+def _is_requested_page(request):
+    # номер больше числа страниц paginator заменяет последней
+    resolved = getattr(request, 'resolved_page', None)
+    return resolved is None or str(resolved) == get_page_id(request)
+
+
+def _compute(view_func, request, args, kwargs, key, primary=False):
+    """Отрендерить страницу и сохранить её с мягким сроком.
+
+    ``primary`` - читать из ``default``: страница достанется всем
+    читателям до следующей смены версии, а отстающая реплика вернула бы
+    её без только что сменившей версию записи.
+    """
+    started = time.time()
+    with routers.use_primary() if primary else nullcontext():
+        response = view_func(request, *args, **kwargs)
+    delta = time.time() - started
+    if (
+        response.status_code == 200
+        and not response.cookies
+        and _is_requested_page(request)
+    ):
+        timeout = settings.LISTING_CACHE_TIMEOUT
+        tiered.set(
+            key,
+            (response, started + timeout, delta),
+            timeout + settings.LISTING_STALE_TIMEOUT,
+        )
+    return response
+
+
+def _detached(request):
+    """Анонимный GET-запрос по тому же адресу для фонового пересчёта.
+
+    Живой запрос к этому времени уже отдан: его пользователь, сессия и
+    атрибуты, которые расставляют middleware и view, не должны попасть
+    в общую страницу или поменяться из другого потока.
+    """
+    extra = {}
+    if 'HTTP_HOST' in request.META:
+        extra['HTTP_HOST'] = request.META['HTTP_HOST']
+    detached = RequestFactory().get(
+        request.get_full_path(), secure=request.is_secure(), **extra
+    )
+    detached.user = AnonymousUser()
+    return detached
+
+
+def _refresh(view_func, request, args, kwargs, key, primary):
+    try:
+        close_old_connections()
+        _compute(view_func, request, args, kwargs, key, primary)
+    except Exception:
+        # до конца LISTING_STALE_TIMEOUT отдаётся старая страница
+        logger.exception('Не удалось обновить страницу %s', request.path)
+    finally:
+        cache.delete(f'{key}:lock')
+        close_old_connections()
+
+
+def _wait_for_entry(key):
+    """Подождать страницу, которую считает держатель блокировки."""
+    deadline = time.monotonic() + settings.LISTING_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(settings.LISTING_LOCK_POLL)
+        entry = tiered.get(key)
+        if entry is not None:
+            return entry
+        if cache.get(f'{key}:lock') is None:
+            return None
+    return None
+
+
+def _get_response(view_func, request, args, kwargs, key, primary=False):
+    """Страница и то, откуда она взята: hit, stale или miss."""
+    lock_key = f'{key}:lock'
+    lock_timeout = settings.LISTING_LOCK_TIMEOUT
+    entry = tiered.get(key)
+    if entry is None and not cache.add(lock_key, True, lock_timeout):
+        entry = _wait_for_entry(key)
+    if entry is None:
+        try:
+            response = _compute(
+                view_func, request, args, kwargs, key, primary
+            )
+            return response, 'miss'
+        finally:
+            cache.delete(lock_key)
+    response, expires, delta = entry
+    if _is_fresh(expires, delta):
+        return response, 'hit'
+    # обновлённая другим процессом страница не рассылается, её копия
+    # в памяти процесса может быть старше общей
+    shared = cache.get(key)
+    if shared is not None and _is_fresh(*shared[1:]):
+        tiered.set_local(key, shared, settings.LOCAL_CACHE_TIMEOUT)
+        return shared[0], 'hit'
+    # add атомарен в memcached и locmem; в файловом кеше два воркера
+    # изредка могут обновить одну страницу одновременно
+    if cache.add(lock_key, True, lock_timeout):
+        refresher.submit(
+            _refresh,
+            view_func,
+            _detached(request),
+            args,
+            kwargs,
+            key,
+            primary,
+        )
+    return response, 'stale'
+
+
+def cache_listing(scope):
+    """Кешировать страницу ленты.
+
+    ``scope`` - имя ленты или функция, строящая его из аргументов view.
+    Тело страницы одно для всех читателей, персональные части
+    вставляет ``core.middleware.PersonalFragmentsMiddleware``.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.method not in ('GET', 'HEAD')
+                or get_page_id(request) is None
+            ):
+                return view_func(request, *args, **kwargs)
+            name = scope(*args, **kwargs) if callable(scope) else scope
+            response, result = _get_response(
+                view_func,
+                request,
+                args,
+                kwargs,
+                _entry_key(name, request),
+                primary=_is_recently_changed(name, request),
+            )
+            metrics.registry.inc('yatube_cache_requests_total', {
+                # у групп и профилей своя лента на каждый slug
+                'scope': name.split(':')[0],
+                'result': result,
+            })
+            return response
+
+        return wrapper
+
+    return decorator
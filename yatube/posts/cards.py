@@ -0,0 +1,27 @@
+"""Кеш карточек постов из ``posts/includes/article.html``.
+
+Ключ фрагмента содержит id поста, ``updated_at`` и имя автора, поэтому
+правка поста или переименование автора сами по себе делают старую
+карточку недоступной. ``forget``
+дополнительно освобождает место, занятое устаревшей карточкой.
+"""
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+FRAGMENT_NAME = 'post_card'
+
+
+def get_key(post):
+    return make_template_fragment_key(
+        FRAGMENT_NAME,
+        [
+            post.pk,
+            post.updated_at.isoformat(),
+            post.author.username,
+            post.author.get_full_name(),
+        ],
+    )
+
+
+def forget(post):
+    cache.delete(get_key(post))
@@ -0,0 +1,119 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарными ``F()``-обновлениями из сигналов моделей,
+а команда ``reconcile_counters`` пересчитывает их, если они разошлись
+с данными.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, User, UserCounters
+
+
+def _add(queryset, delta, field):
+    if delta < 0:
+        # не уходить ниже нуля, расхождение исправит reconcile_counters
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def change_author_posts(author_id, delta):
+    _add(UserCounters.objects.filter(user_id=author_id), delta, 'posts_count')
+
+
+def change_group_posts(group_id, delta):
+    if group_id is not None:
+        _add(Group.objects.filter(pk=group_id), delta, 'posts_count')
+
+
+def change_post_comments(post_id, delta):
+    _add(Post.objects.filter(pk=post_id), delta, 'comments_count')
+
+
+def change_follow(user_id, author_id, delta):
+    _add(
+        UserCounters.objects.filter(user_id=author_id),
+        delta,
+        'followers_count',
+    )
+    _add(
+        UserCounters.objects.filter(user_id=user_id),
+        delta,
+        'following_count',
+    )
+
+
+def for_user(user):
+    """Счётчики пользователя.
+
+    Строки может не быть, если пользователь загружен ``loaddata``
+    или ``bulk_create`` в обход сигналов: тогда она создаётся
+    с посчитанными значениями.
+    """
+    try:
+        return user.counters
+    except UserCounters.DoesNotExist:
+        pass
+    user_counters, _ = UserCounters.objects.get_or_create(
+        user=user,
+        defaults={
+            'posts_count': Post.objects.filter(author=user).count(),
+            'followers_count': Follow.objects.filter(author=user).count(),
+            'following_count': Follow.objects.filter(user=user).count(),
+        },
+    )
+    user.counters = user_counters
+    return user_counters
+
+
+def _count(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def _reconcile(queryset, field, actual):
+    drifted = (
+        queryset.annotate(actual=actual)
+        .exclude(**{field: F('actual')})
+        .count()
+    )
+    if drifted:
+        queryset.update(**{field: actual})
+    return drifted
+
+
+def reconcile():
+    """Пересчитать все счётчики, вернуть число исправленных записей."""
+    missing = User.objects.filter(counters__isnull=True)
+    UserCounters.objects.bulk_create(
+        UserCounters(user_id=user_id)
+        for user_id in missing.values_list('pk', flat=True)
+    )
+    user_counters = UserCounters.objects.all()
+    return {
+        'user.posts_count': _reconcile(
+            user_counters, 'posts_count', _count(Post.objects, 'author')
+        ),
+        'user.followers_count': _reconcile(
+            user_counters, 'followers_count', _count(Follow.objects, 'author')
+        ),
+        'user.following_count': _reconcile(
+            user_counters, 'following_count', _count(Follow.objects, 'user')
+        ),
+        'group.posts_count': _reconcile(
+            Group.objects.all(), 'posts_count', _count(Post.objects, 'group')
+        ),
+        'post.comments_count': _reconcile(
+            Post.objects.all(),
+            'comments_count',
+            _count(Comment.objects, 'post'),
+        ),
+    }
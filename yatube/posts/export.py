@@ -0,0 +1,102 @@
+"""Потоковая выгрузка таблиц постов в NDJSON или CSV.
+
+Строки читаются порциями по первичному ключу (``WHERE id > последний``),
+поэтому память не зависит от размера таблицы, а прерванную выгрузку
+можно продолжить с последнего записанного id. Каждая порция пишется
+целиком: при сжатии - отдельным gzip-членом, так что файл после любой
+порции остаётся корректным.
+"""
+import csv
+import gzip
+import io
+import json
+
+from .models import Comment, Follow, Group, Post
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (NDJSON, CSV)
+
+# таблица -> (модель, поля для values())
+TABLES = {
+    'groups': (Group, ('id', 'slug', 'title', 'description')),
+    'posts': (
+        Post,
+        (
+            'id',
+            'text',
+            'pub_date',
+            'updated_at',
+            'author_id',
+            'author__username',
+            'group_id',
+            'group__slug',
+            'image',
+        ),
+    ),
+    'comments': (
+        Comment,
+        (
+            'id',
+            'post_id',
+            'author_id',
+            'author__username',
+            'text',
+            'created',
+        ),
+    ),
+    'follows': (
+        Follow,
+        ('id', 'user_id', 'user__username', 'author_id', 'author__username'),
+    ),
+}
+
+
+def file_name(table, fmt, compress=False):
+    return f'{table}.{fmt}' + ('.gz' if compress else '')
+
+
+def iter_chunks(table, after_id=0, chunk_size=2000):
+    """Порции строк таблицы с id больше ``after_id``."""
+    model, fields = TABLES[table]
+    rows = model.objects.order_by('pk').values_list(*fields)
+    while True:
+        chunk = list(rows.filter(pk__gt=after_id)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1][0]
+
+
+def _value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def header(table, fmt, compress=False):
+    """Заголовок CSV, для NDJSON пустой."""
+    if fmt != CSV:
+        return b''
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(TABLES[table][1])
+    data = buffer.getvalue().encode()
+    return gzip.compress(data) if compress else data
+
+
+def encode(table, chunk, fmt, compress=False):
+    """Байты порции в нужном формате."""
+    fields = TABLES[table][1]
+    buffer = io.StringIO()
+    if fmt == CSV:
+        writer = csv.writer(buffer)
+        for row in chunk:
+            writer.writerow([_value(value) for value in row])
+    else:
+        for row in chunk:
+            record = {
+                field: _value(value) for field, value in zip(fields, row)
+            }
+            buffer.write(json.dumps(record, ensure_ascii=False) + '\n')
+    data = buffer.getvalue().encode()
+    return gzip.compress(data) if compress else data
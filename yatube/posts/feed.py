@@ -0,0 +1,176 @@
+"""Материализованная лента подписок.
+
+Новый пост раскладывается по лентам подписчиков автора при записи
+(fan-out on write). Для авторов, у которых подписчиков больше
+``FEED_FANOUT_LIMIT``, посты не раскладываются, а подмешиваются
+при чтении ленты (fan-out on read). Посты, написанные автором, пока он
+был в этом списке, раскладываются, когда он из него выходит. В ленте
+хранится не больше ``FEED_MAX_ITEMS`` постов: каждая раскладка убирает
+у читателей то, что вышло за предел.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Q, Subquery
+
+from .models import FeedItem, Follow, Post
+
+CELEBRITIES_CACHE_KEY = 'feed:celebrities'
+# последний посчитанный список без срока: по нему видно, кто из него вышел
+KNOWN_CELEBRITIES_KEY = 'feed:celebrities:known'
+
+
+def _save_celebrities(celebrities):
+    cache.set(
+        CELEBRITIES_CACHE_KEY,
+        celebrities,
+        settings.FEED_CELEBRITIES_TIMEOUT,
+    )
+    cache.set(KNOWN_CELEBRITIES_KEY, celebrities, None)
+
+
+def get_celebrity_ids():
+    """Авторы, чьи посты читаются из ленты без раскладки."""
+    celebrities = cache.get(CELEBRITIES_CACHE_KEY)
+    if celebrities is None:
+        celebrities = set(
+            Follow.objects.values('author')
+            .annotate(followers=Count('pk'))
+            .filter(followers__gt=settings.FEED_FANOUT_LIMIT)
+            .values_list('author', flat=True)
+        )
+        previous = cache.get(KNOWN_CELEBRITIES_KEY) or set()
+        _save_celebrities(celebrities)
+        # их посты больше не подмешиваются при чтении, а разложены
+        # были только те, что написаны до попадания в список
+        left = previous - celebrities
+        if left:
+            _fill_feeds(left, celebrities)
+    return celebrities
+
+
+def _mark_celebrity(author_id):
+    celebrities = get_celebrity_ids()
+    if author_id not in celebrities:
+        celebrities.add(author_id)
+        _save_celebrities(celebrities)
+
+
+def fan_out(post):
+    """Положить новый пост в ленты подписчиков автора."""
+    limit = settings.FEED_FANOUT_LIMIT
+    follower_ids = list(
+        Follow.objects.filter(author_id=post.author_id).values_list(
+            'user_id', flat=True
+        )[:limit + 1]
+    )
+    if len(follower_ids) > limit:
+        _mark_celebrity(post.author_id)
+        return
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in follower_ids
+        ),
+        ignore_conflicts=True,
+    )
+    _prune_followers(post.author_id)
+
+
+def _prune_followers(author_id):
+    """Убрать из лент подписчиков автора запись за ``FEED_MAX_ITEMS``.
+
+    Ленты не длиннее предела, а раскладка добавляет в каждую один пост,
+    поэтому лишней бывает только одна запись. Все они удаляются одним
+    запросом, а не ``prune`` на каждого подписчика.
+    """
+    limit = settings.FEED_MAX_ITEMS
+    overflow = FeedItem.objects.filter(user_id=OuterRef('user_id')).values(
+        'pk'
+    )[limit:limit + 1]
+    stale = (
+        Follow.objects.filter(author_id=author_id)
+        .annotate(stale=Subquery(overflow))
+        .values('stale')
+    )
+    FeedItem.objects.filter(pk__in=stale).delete()
+
+
+def prune(user_id):
+    """Оставить в ленте не больше ``FEED_MAX_ITEMS`` свежих постов."""
+    stale = FeedItem.objects.filter(user_id=user_id).values_list(
+        'pk', flat=True
+    )[settings.FEED_MAX_ITEMS:]
+    FeedItem.objects.filter(pk__in=list(stale)).delete()
+
+
+def backfill(user_id, author_id):
+    """Заполнить ленту недавними постами автора после подписки."""
+    if author_id in get_celebrity_ids():
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )[:settings.FEED_MAX_ITEMS]
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ),
+        ignore_conflicts=True,
+    )
+    prune(user_id)
+
+
+def rebuild(author_ids):
+    """Разложить посты авторов по лентам подписчиков заново.
+
+    Нужно после массовой загрузки, когда сигналы не срабатывали.
+    Ленты заполняются по читателям, а не по парам подписок.
+    """
+    cache.delete(CELEBRITIES_CACHE_KEY)
+    _fill_feeds(author_ids, get_celebrity_ids())
+
+
+def _fill_feeds(author_ids, celebrities):
+    follows = (
+        Follow.objects.filter(author_id__in=list(author_ids))
+        .exclude(author_id__in=celebrities)
+        .order_by('user_id')
+        .values_list('user_id', 'author_id')
+    )
+    readers = {}
+    for user_id, author_id in follows.iterator():
+        readers.setdefault(user_id, []).append(author_id)
+    for user_id, authors in readers.items():
+        posts = Post.objects.filter(author_id__in=authors).values_list(
+            'pk', 'pub_date'
+        )[:settings.FEED_MAX_ITEMS]
+        FeedItem.objects.bulk_create(
+            (
+                FeedItem(user_id=user_id, post_id=post_id, pub_date=pub_date)
+                for post_id, pub_date in posts
+            ),
+            ignore_conflicts=True,
+        )
+        prune(user_id)
+
+
+def remove(user_id, author_id):
+    """Убрать из ленты посты автора после отписки."""
+    FeedItem.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def get_feed(user):
+    """Посты ленты: материализованная часть плюс популярные авторы."""
+    materialized = FeedItem.objects.filter(user=user).values('post')[
+        :settings.FEED_MAX_ITEMS
+    ]
+    condition = Q(pk__in=materialized)
+    celebrities = get_celebrity_ids()
+    if celebrities:
+        followed = Follow.objects.filter(
+            user=user, author_id__in=celebrities
+        ).values('author')
+        condition |= Q(author__in=followed)
+    return Post.objects.select_related('author', 'group').filter(condition)
@@ -0,0 +1,32 @@
+"""Персональные фрагменты страниц постов, см. ``core.fragments``."""
+from core.fragments import register
+
+from .forms import CommentForm
+from .models import Follow
+
+
+def follow_button_context(request, author_id, username):
+    user = request.user
+    following = (
+        user.is_authenticated
+        and Follow.objects.filter(user=user, author_id=author_id).exists()
+    )
+    return {'following': following}
+
+
+def comment_form_context(request, post_id):
+    return {'form': CommentForm()}
+
+
+register('feed_switcher', 'posts/includes/switcher.html')
+register(
+    'follow_button',
+    'posts/includes/follow_button.html',
+    follow_button_context,
+)
+register('post_edit_link', 'posts/includes/post_edit_link.html')
+register(
+    'comment_form',
+    'posts/includes/comment_form.html',
+    comment_form_context,
+)
@@ -0,0 +1,123 @@
+"""Валидаторы свежести HTML-страниц для условного GET.
+
+Каждая функция дешёвым запросом собирает то, от чего зависит
+страница: время последней правки постов, счётчики, поколение кеша
+сообществ и того, кто смотрит страницу (шапка, кнопки подписки
+и правки). Совпадение ETag даёт 304 без запросов страницы
+и рендеринга шаблона.
+"""
+from datetime import datetime
+
+from django.db.models import Count, Exists, Max, OuterRef
+from django.utils import timezone
+
+from . import caching, feed
+from .models import Follow, Group, Post, User
+
+
+def _viewer_state(request):
+    # год выводится в подвале каждой страницы
+    return [request.user.pk, timezone.now().year, caching.get_generation()]
+
+
+def group_posts_queryset(slug):
+    # скалярный подзапрос вместо JOIN: MAX берётся из индекса
+    # (group, updated_at) одним поиском
+    group = Group.objects.filter(slug=slug).values('pk')[:1]
+    return Post.objects.filter(group_id=group)
+
+
+def author_posts_queryset(username):
+    author = User.objects.filter(username=username).values('pk')[:1]
+    return Post.objects.filter(author_id=author)
+
+
+def _last_change(last, versions):
+    # версия ленты - время её смены (удаление поста, правка сообществ),
+    # иначе Last-Modified не вырос бы после удаления
+    changed = datetime.fromtimestamp(max(versions) / 10**9, timezone.utc)
+    return max(changed, last) if last else changed
+
+
+def listing_state(scope, posts):
+    """Время последнего изменения ленты и версии её кеша.
+
+    ``MAX(updated_at)`` читается из индекса, а не сканом таблицы.
+    Удаление поста максимум не меняет, его отражает версия ленты.
+    """
+    last = posts.aggregate(last=Max('updated_at'))['last']
+    versions = caching.get_scope_versions(scope)
+    return _last_change(last, versions), versions
+
+
+def feed_state(user):
+    """То же для ленты подписок. Версии кеша у неё нет, удаления видны
+    по числу постов: лента ограничена подписками читателя.
+
+    Last-Modified не отдаётся: удаление поста и отписка его не сдвигают,
+    и клиент с одним ``If-Modified-Since`` получал бы 304.
+    """
+    state = feed.get_feed(user).aggregate(
+        last=Max('updated_at'), total=Count('pk')
+    )
+    return None, [state['last'], state['total']]
+
+
+def index(request):
+    last, state = listing_state(caching.INDEX_SCOPE, Post.objects.all())
+    return last, state + _viewer_state(request)
+
+
+def group_posts(request, slug):
+    last, state = listing_state(
+        caching.group_scope(slug), group_posts_queryset(slug)
+    )
+    return last, state + _viewer_state(request)
+
+
+def profile(request, username):
+    following = Follow.objects.filter(
+        user_id=request.user.pk, author=OuterRef('pk')
+    )
+    row = (
+        User.objects.filter(username=username)
+        .annotate(
+            last=Max('posts__updated_at'),
+            viewer_follows=Exists(following),
+        )
+        .values_list(
+            'last',
+            'first_name',
+            'last_name',
+            'counters__posts_count',
+            'counters__followers_count',
+            'viewer_follows',
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    last, *state = row
+    versions = caching.get_scope_versions(caching.profile_scope(username))
+    return _last_change(last, versions), state + _viewer_state(request)
+
+
+def post_detail(request, post_id):
+    row = (
+        Post.objects.filter(pk=post_id)
+        .annotate(last_comment=Max('comments__created'))
+        .values_list(
+            'updated_at',
+            'last_comment',
+            'comments_count',
+            'author__first_name',
+            'author__last_name',
+            'author__counters__posts_count',
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    updated_at, last_comment, *state = row
+    last = max(filter(None, (updated_at, last_comment)))
+    return last, [last_comment, *state] + _viewer_state(request)
@@ -0,0 +1,329 @@
+"""Массовая загрузка сообществ, постов, комментариев и подписок.
+
+Строки читаются потоком из NDJSON или CSV (в том числе сжатых gzip)
+в формате ``export_posts`` и вставляются через ``bulk_create``
+порциями, каждая в своей транзакции. Авторы и сообщества ищутся
+по username и slug через словари в памяти, id постов источника
+сопоставляются с новыми id. Строку, которую не разобрать, описывает
+``RowError`` с номером строки файла. ``bulk_create`` не отправляет сигналы:
+журнал изменений пишется в транзакции каждой порции, а счётчики,
+поисковый индекс, ленты, миниатюры и кеш обновляются один раз
+в ``finish()``.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import (
+    caching,
+    changelog,
+    counters,
+    export,
+    feed,
+    search,
+    thumbnails,
+)
+from .models import Change, Comment, Follow, Group, Post, User
+
+# сообщества и посты нужны раньше комментариев и подписок
+TABLE_ORDER = ('groups', 'posts', 'comments', 'follows')
+
+
+class RowError(ValueError):
+    """Строку файла не разобрать."""
+
+    def __init__(self, line, message):
+        super().__init__(message)
+        self.line = line
+
+
+class Row(dict):
+    """Строка файла вместе с её номером."""
+
+    def __init__(self, values, line):
+        super().__init__(values)
+        self.line = line
+
+
+def table_of(path):
+    """Таблица по имени файла выгрузки: posts.ndjson.gz -> posts."""
+    return os.path.basename(path).split('.')[0]
+
+
+def read_rows(path):
+    """Строки файла как ``Row``, формат определяется по расширению."""
+    binary = gzip.open(path) if path.endswith('.gz') else open(path, 'rb')
+    with io.TextIOWrapper(binary, encoding='utf-8', newline='') as source:
+        if f'.{export.CSV}' in os.path.basename(path):
+            reader = csv.DictReader(source)
+            for row in reader:
+                yield Row(row, reader.line_num)
+            return
+        for number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield Row(json.loads(line), number)
+            except ValueError as exc:
+                raise RowError(number, f'не JSON: {exc}') from exc
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _empty(value):
+    return value is None or value == ''
+
+
+def _datetime(value, default):
+    if _empty(value):
+        return default
+    try:
+        parsed = parse_datetime(value)
+    except (TypeError, ValueError):
+        parsed = None
+    if parsed is None:
+        raise ValueError(f'не дата: {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+@contextmanager
+def _parsing(row):
+    """Ошибку разбора значения выдать как ``RowError`` этой строки."""
+    try:
+        yield
+    except ValueError as exc:
+        raise RowError(getattr(row, 'line', None), str(exc)) from exc
+
+
+@contextmanager
+def _keep_timestamps():
+    """Сохранять даты из файла вместо auto_now и auto_now_add."""
+    fields = [
+        Post._meta.get_field('pub_date'),
+        Post._meta.get_field('updated_at'),
+        Comment._meta.get_field('created'),
+    ]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _insert(model, objs):
+    """Вставить объекты и вернуть их новые id в том же порядке."""
+    if connection.features.can_return_ids_from_bulk_insert:
+        model.objects.bulk_create(objs)
+        return [obj.pk for obj in objs]
+    # SQLite не возвращает id из bulk_create; внутри транзакции
+    # новые строки - это все строки с id больше прежнего максимума
+    last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    model.objects.bulk_create(objs)
+    ids = list(
+        model.objects.filter(pk__gt=last)
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+    if len(ids) != len(objs):
+        raise RuntimeError(
+            f'Во время загрузки в {model._meta.db_table} писал кто-то ещё'
+        )
+    return ids
+
+
+class Importer:
+    def __init__(self, batch_size=1000, create_users=True):
+        self.batch_size = batch_size
+        self.create_users = create_users
+        self.users = {}
+        self.groups = {}
+        # id поста в источнике -> id в этой базе
+        self.posts = {}
+        self.post_ids = []
+        self.author_ids = set()
+        self.imported = Counter()
+        self.skipped = Counter()
+
+    def _resolve_users(self, usernames):
+        missing = {name for name in usernames if name not in self.users}
+        missing.discard(None)
+        missing.discard('')
+        if not missing:
+            return
+        self.users.update(
+            User.objects.filter(username__in=missing).values_list(
+                'username', 'pk'
+            )
+        )
+        new = missing - set(self.users)
+        if new and self.create_users:
+            password = make_password(None)
+            User.objects.bulk_create(
+                (User(username=name, password=password) for name in new),
+                ignore_conflicts=True,
+            )
+            self.users.update(
+                User.objects.filter(username__in=new).values_list(
+                    'username', 'pk'
+                )
+            )
+
+    def _resolve_groups(self, slugs):
+        missing = {slug for slug in slugs if slug not in self.groups}
+        missing.discard(None)
+        missing.discard('')
+        if missing:
+            self.groups.update(
+                Group.objects.filter(slug__in=missing).values_list(
+                    'slug', 'pk'
+                )
+            )
+
+    def import_users(self, usernames):
+        for batch in _batches(usernames, self.batch_size):
+            self._resolve_users(batch)
+
+    def import_groups(self, rows):
+        for batch in _batches(rows, self.batch_size):
+            self._resolve_groups(row['slug'] for row in batch)
+            new = {}
+            for row in batch:
+                if row['slug'] in self.groups or row['slug'] in new:
+                    self.skipped['groups'] += 1
+                    continue
+                new[row['slug']] = Group(
+                    slug=row['slug'],
+                    title=row['title'],
+                    description=row.get('description') or '',
+                )
+            with transaction.atomic():
+                Group.objects.bulk_create(new.values())
+            self._resolve_groups(new)
+            self.imported['groups'] += len(new)
+
+    def import_posts(self, rows):
+        now = timezone.now()
+        for batch in _batches(rows, self.batch_size):
+            self._resolve_users(row['author__username'] for row in batch)
+            self._resolve_groups(row.get('group__slug') for row in batch)
+            source_ids, objs = [], []
+            for row in batch:
+                author_id = self.users.get(row['author__username'])
+                if author_id is None:
+                    self.skipped['posts'] += 1
+                    continue
+                with _parsing(row):
+                    pub_date = _datetime(row.get('pub_date'), now)
+                    updated_at = _datetime(row.get('updated_at'), pub_date)
+                source_ids.append(row.get('id'))
+                objs.append(Post(
+                    text=row['text'],
+                    author_id=author_id,
+                    group_id=self.groups.get(row.get('group__slug')),
+                    image=row.get('image') or '',
+                    pub_date=pub_date,
+                    updated_at=updated_at,
+                ))
+            with transaction.atomic(), _keep_timestamps():
+                new_ids = _insert(Post, objs)
+                changelog.record_many(Change.POST, new_ids, Change.CREATE)
+            self.post_ids.extend(new_ids)
+            for source_id, new_id in zip(source_ids, new_ids):
+                if not _empty(source_id):
+                    self.posts[int(source_id)] = new_id
+            self.author_ids.update(obj.author_id for obj in objs)
+            self.imported['posts'] += len(objs)
+
+    def import_comments(self, rows):
+        now = timezone.now()
+        for batch in _batches(rows, self.batch_size):
+            self._resolve_users(row['author__username'] for row in batch)
+            objs = []
+            for row in batch:
+                with _parsing(row):
+                    source_post_id = int(row['post_id'])
+                    created = _datetime(row.get('created'), now)
+                author_id = self.users.get(row['author__username'])
+                post_id = self.posts.get(source_post_id)
+                if author_id is None or post_id is None:
+                    self.skipped['comments'] += 1
+                    continue
+                objs.append(Comment(
+                    text=row['text'],
+                    author_id=author_id,
+                    post_id=post_id,
+                    created=created,
+                ))
+            with transaction.atomic(), _keep_timestamps():
+                new_ids = _insert(Comment, objs)
+                changelog.record_many(Change.COMMENT, new_ids, Change.CREATE)
+            self.imported['comments'] += len(objs)
+
+    def import_follows(self, rows):
+        for batch in _batches(rows, self.batch_size):
+            self._resolve_users(
+                name
+                for row in batch
+                for name in (row['user__username'], row['author__username'])
+            )
+            pairs = set()
+            for row in batch:
+                user_id = self.users.get(row['user__username'])
+                author_id = self.users.get(row['author__username'])
+                if None in (user_id, author_id) or user_id == author_id:
+                    continue
+                pairs.add((user_id, author_id))
+            with transaction.atomic():
+                # повторы и уже существующие подписки считаются
+                # пропущенными: ignore_conflicts молча их отбросит
+                existing = set(
+                    Follow.objects.filter(
+                        user_id__in={user_id for user_id, _ in pairs},
+                        author_id__in={author_id for _, author_id in pairs},
+                    ).values_list('user_id', 'author_id')
+                )
+                new = pairs - existing
+                Follow.objects.bulk_create(
+                    (
+                        Follow(user_id=user_id, author_id=author_id)
+                        for user_id, author_id in new
+                    ),
+                    ignore_conflicts=True,
+                )
+            self.author_ids.update(author_id for _, author_id in new)
+            self.imported['follows'] += len(new)
+            self.skipped['follows'] += len(batch) - len(new)
+
+    def import_table(self, table, rows):
+        getattr(self, f'import_{table}')(rows)
+
+    def finish(self):
+        """Обслуживание, отложенное до конца загрузки."""
+        counters.reconcile()
+        search.index_posts(self.post_ids)
+        feed.rebuild(self.author_ids)
+        thumbnails.backfill(self.post_ids)
+        caching.invalidate_all()
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Готовит миниатюры постам с картинкой, у которых их нет'
+
+    def handle(self, *args, **options):
+        processed, failed = thumbnails.backfill()
+        if failed:
+            self.stdout.write(
+                self.style.WARNING(f'Не удалось подготовить: {failed}')
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Миниатюр подготовлено: {processed - failed}'
+            )
+        )
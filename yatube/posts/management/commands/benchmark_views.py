@@ -0,0 +1,189 @@
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.utils import timezone
+
+from core.testing import clear_caches, isolated_caches
+from posts import benchmarks
+from posts.models import User
+
+SCENARIOS = (
+    'index',
+    'group_posts',
+    'profile',
+    'post_detail',
+    'follow_index',
+    'post_create',
+    'add_comment',
+)
+COMPARED = ('p50_ms', 'p99_ms', 'queries_mean', 'peak_memory_kb')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку, число запросов и память страниц постов '
+        'на сгенерированных данных в отдельной тестовой базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument(
+            '--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='очищать кеш перед каждым запросом',
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='не удалять базу с данными, чтобы не генерировать их снова',
+        )
+        parser.add_argument(
+            '--output', help='куда сохранить результаты в JSON'
+        )
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения'
+        )
+
+    def _create_db(self, keepdb):
+        settings_dict = connection.settings_dict
+        if connection.vendor == 'sqlite' and not settings_dict['TEST']['NAME']:
+            # файловая база ближе к боевой и переживает --keepdb
+            settings_dict['TEST']['NAME'] = os.path.join(
+                settings.BASE_DIR, 'benchmark.sqlite3'
+            )
+        old_name = settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=keepdb
+        )
+        return old_name
+
+    def _seed(self, options):
+        if User.objects.filter(username='bench_user_0').exists():
+            self.stdout.write('Данные уже есть, генерация пропущена')
+            return None
+        started = time.monotonic()
+        sizes = benchmarks.seed(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows_per_user=options['follows_per_user'],
+        )
+        self.stdout.write(
+            f'Данные сгенерированы за {time.monotonic() - started:.1f} с: '
+            + ', '.join(f'{table} {count}' for table, count in sizes.items())
+        )
+        return sizes
+
+    def _report(self, results, previous):
+        for name, result in results.items():
+            line = (
+                f'{name:>13}: p50 {result["p50_ms"]:8.2f} мс, '
+                f'p99 {result["p99_ms"]:8.2f} мс, '
+                f'запросов {result["queries_mean"]:6.1f}, '
+                f'память {result["peak_memory_kb"]:8.1f} КБ'
+            )
+            before = previous.get(name)
+            if before:
+                deltas = [
+                    f'{key} {self._delta(before[key], result[key])}'
+                    for key in COMPARED
+                ]
+                line += ' | ' + ', '.join(deltas)
+            self.stdout.write(line)
+
+    @staticmethod
+    def _delta(before, after):
+        if not before:
+            return 'н/д'
+        return f'{(after - before) / before * 100:+.1f}%'
+
+    def _load_previous(self, path):
+        if not path:
+            return {}
+        try:
+            with open(path) as source:
+                return json.load(source)['results']
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f'Не прочитать {path}: {exc}')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должен быть положительным')
+        previous = self._load_previous(options['compare'])
+        setup_test_environment()
+        # страницы тестовой базы не должны попасть в общий кеш проекта,
+        # а очистка перед замерами - стереть его
+        cache_dir = tempfile.mkdtemp(prefix='yatube_benchmark_cache_')
+        old_name = self._create_db(options['keepdb'])
+        try:
+            with isolated_caches(cache_dir):
+                clear_caches()
+                sizes = self._seed(options)
+                results = benchmarks.run(
+                    iterations=options['iterations'],
+                    names=options['scenarios'],
+                    cold=options['cold'],
+                )
+                cache_backend = settings.CACHES['default']['BACKEND']
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            teardown_test_environment()
+
+        self._report(results, previous)
+        if options['output']:
+            data = {
+                'commit': _git_commit(),
+                'created': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'cache': cache_backend,
+                'cold': options['cold'],
+                'dataset': sizes,
+                'results': results,
+            }
+            with open(options['output'], 'w') as target:
+                json.dump(data, target, ensure_ascii=False, indent=2)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Результаты сохранены в {options["output"]}'
+                )
+            )
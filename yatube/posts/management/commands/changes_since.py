@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts import changelog
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит изменения постов и комментариев после номера seq, '
+        'по одному JSON-объекту в строке'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('seq', type=int, help='последний известный номер')
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=changelog.CHANGES_LIMIT,
+            help='сколько изменений вывести',
+        )
+
+    def handle(self, *args, **options):
+        changes = changelog.changes_since(options['seq'], options['limit'])
+        for change in changes:
+            self.stdout.write(
+                json.dumps(changelog.as_dict(change), ensure_ascii=False)
+            )
+        last = changes[-1].seq if changes else options['seq']
+        self.stderr.write(
+            f'Изменений: {len(changes)}, последний номер: {last}'
+        )
@@ -0,0 +1,140 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+STATE_FILE = 'export_state.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает сообщества, посты, комментарии и подписки '
+        'в NDJSON или CSV'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='каталог для файлов выгрузки')
+        parser.add_argument(
+            '--format', choices=export.FORMATS, default=export.NDJSON
+        )
+        parser.add_argument(
+            '--gzip', action='store_true', help='сжимать файлы gzip'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='сколько строк читать за один запрос',
+        )
+        parser.add_argument(
+            '--tables',
+            nargs='+',
+            choices=list(export.TABLES),
+            default=list(export.TABLES),
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='продолжить прерванную выгрузку с последнего id',
+        )
+
+    def _load_state(self, path, options):
+        if not options['resume'] or not os.path.exists(path):
+            return {}
+        with open(path) as state_file:
+            state = json.load(state_file)
+        if (state['format'], state['gzip']) != (
+            options['format'],
+            options['gzip'],
+        ):
+            raise CommandError(
+                'Формат продолжаемой выгрузки не совпадает с --format/--gzip'
+            )
+        return state['tables']
+
+    def _save_state(self, path, tables, options):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as state_file:
+            json.dump(
+                {
+                    'format': options['format'],
+                    'gzip': options['gzip'],
+                    'tables': tables,
+                },
+                state_file,
+            )
+        os.replace(tmp_path, path)
+
+    def _export_table(self, table, progress, save_state, options):
+        fmt, compress = options['format'], options['gzip']
+        path = os.path.join(
+            options['output'], export.file_name(table, fmt, compress)
+        )
+        if progress and os.path.exists(path):
+            output = open(path, 'r+b')
+            # дописанная после сохранения состояния часть порции
+            output.truncate(progress['offset'])
+            output.seek(progress['offset'])
+        else:
+            output = open(path, 'wb')
+            output.write(export.header(table, fmt, compress))
+            progress = {'last_id': 0, 'rows': 0}
+
+        rows = written = 0
+        with output:
+            chunks = export.iter_chunks(
+                table, progress['last_id'], options['chunk_size']
+            )
+            for chunk in chunks:
+                data = export.encode(table, chunk, fmt, compress)
+                output.write(data)
+                output.flush()
+                rows += len(chunk)
+                written += len(data)
+                progress = {
+                    'last_id': chunk[-1][0],
+                    'rows': progress['rows'] + len(chunk),
+                    'offset': output.tell(),
+                }
+                save_state(table, progress)
+            progress['offset'] = output.tell()
+            save_state(table, progress)
+        return rows, written
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть положительным')
+        os.makedirs(options['output'], exist_ok=True)
+        state_path = os.path.join(options['output'], STATE_FILE)
+        tables = self._load_state(state_path, options)
+
+        def save_state(table, progress):
+            tables[table] = progress
+            self._save_state(state_path, tables, options)
+
+        total_rows = total_bytes = 0
+        started = time.monotonic()
+        for table in options['tables']:
+            table_started = time.monotonic()
+            rows, written = self._export_table(
+                table, tables.get(table), save_state, options
+            )
+            elapsed = time.monotonic() - table_started
+            self.stdout.write(
+                f'{table}: строк {rows}, {written / 1024:.1f} КБ '
+                f'за {elapsed:.2f} с ({rows / max(elapsed, 1e-6):.0f} строк/с)'
+            )
+            total_rows += rows
+            total_bytes += written
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Выгружено строк: {total_rows}, '
+                f'{total_bytes / 1024:.1f} КБ за {elapsed:.2f} с '
+                f'({total_rows / max(elapsed, 1e-6):.0f} строк/с)'
+            )
+        )
@@ -0,0 +1,102 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export, importing
+
+
+class Command(BaseCommand):
+    help = (
+        'Массово загружает сообщества, посты, комментарии и подписки '
+        'из файлов NDJSON или CSV в формате export_posts'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            help='файлы groups/posts/comments/follows или каталог с ними',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='сколько строк вставлять в одной транзакции',
+        )
+        parser.add_argument(
+            '--no-create-users',
+            action='store_true',
+            help='пропускать строки с неизвестными пользователями',
+        )
+
+    def _collect(self, paths):
+        files = {}
+        for path in paths:
+            if os.path.isdir(path):
+                names = sorted(os.listdir(path))
+                candidates = [
+                    os.path.join(path, name)
+                    for name in names
+                    if importing.table_of(name) in export.TABLES
+                ]
+            elif os.path.exists(path):
+                candidates = [path]
+            else:
+                raise CommandError(f'Файл не найден: {path}')
+            for candidate in candidates:
+                table = importing.table_of(candidate)
+                if table not in export.TABLES:
+                    raise CommandError(
+                        f'Не понять таблицу по имени файла: {candidate}'
+                    )
+                files.setdefault(table, []).append(candidate)
+        return files
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        files = self._collect(options['paths'])
+        importer = importing.Importer(
+            batch_size=options['batch_size'],
+            create_users=not options['no_create_users'],
+        )
+
+        started = time.monotonic()
+        for table in importing.TABLE_ORDER:
+            for path in files.get(table, ()):
+                table_started = time.monotonic()
+                imported = importer.imported[table]
+                try:
+                    importer.import_table(table, importing.read_rows(path))
+                except importing.RowError as exc:
+                    raise CommandError(
+                        f'{path}, строка {exc.line}: {exc}'
+                    ) from exc
+                rows = importer.imported[table] - imported
+                elapsed = time.monotonic() - table_started
+                self.stdout.write(
+                    f'{os.path.basename(path)}: загружено строк {rows} '
+                    f'за {elapsed:.2f} с '
+                    f'({rows / max(elapsed, 1e-6):.0f} строк/с)'
+                )
+        loaded = time.monotonic() - started
+
+        finish_started = time.monotonic()
+        importer.finish()
+        self.stdout.write(
+            'Счётчики, поиск, ленты, миниатюры и кеш обновлены за '
+            f'{time.monotonic() - finish_started:.2f} с'
+        )
+
+        for table, skipped in importer.skipped.items():
+            self.stdout.write(
+                self.style.WARNING(f'{table}: пропущено строк {skipped}')
+            )
+        total = sum(importer.imported.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Загружено строк: {total} за {loaded:.2f} с '
+                f'({total / max(loaded, 1e-6):.0f} строк/с)'
+            )
+        )
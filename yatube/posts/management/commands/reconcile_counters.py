@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок'
+
+    def handle(self, *args, **options):
+        drift = counters.reconcile()
+        for counter, fixed in drift.items():
+            self.stdout.write(f'{counter}: исправлено записей {fixed}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Всего исправлено: {sum(drift.values())}')
+        )
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def index_posts(apps, schema_editor):
+    from posts.search import count_terms
+
+    Post = apps.get_model('posts', 'Post')
+    SearchToken = apps.get_model('posts', 'SearchToken')
+    for post_id, text in Post.objects.values_list('pk', 'text').iterator():
+        SearchToken.objects.bulk_create(
+            SearchToken(post_id=post_id, token=token, count=count)
+            for token, count in count_terms(text).items()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, verbose_name='основа слова')),
+                ('count', models.PositiveIntegerField(default=1, verbose_name='число вхождений')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='posts.Post', verbose_name='пост')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchtoken',
+            constraint=models.UniqueConstraint(fields=('token', 'post'), name='unique_search_token'),
+        ),
+        migrations.RunPython(index_posts, migrations.RunPython.noop),
+    ]
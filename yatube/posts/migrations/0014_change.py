@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_searchtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('seq', models.AutoField(primary_key=True, serialize=False, verbose_name='номер изменения')),
+                ('model', models.CharField(choices=[('post', 'пост'), ('comment', 'комментарий')], max_length=16, verbose_name='модель')),
+                ('object_id', models.PositiveIntegerField(verbose_name='id объекта')),
+                ('action', models.CharField(choices=[('create', 'создание'), ('update', 'изменение'), ('delete', 'удаление')], max_length=16, verbose_name='действие')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='дата изменения')),
+            ],
+            options={
+                'ordering': ('seq',),
+            },
+        ),
+    ]
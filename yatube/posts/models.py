@@ -1,10 +1,48 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 
 User = get_user_model()
 
 
-class Group(models.Model):
+class CountersMixin:
+    """Не перезаписывать счётчики при сохранении загруженного объекта.
+
+    Счётчики меняются только атомарными ``F()``-обновлениями, поэтому
+    обычный ``save()`` (форма, админка) не должен затирать их значениями,
+    прочитанными до параллельного обновления.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        ):
+            kwargs['update_fields'] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class ChangeLogMixin:
+    """Сохранять объект в одной транзакции с записью журнала изменений.
+
+    ``post_save`` отправляется уже после записи объекта, и в режиме
+    autocommit без транзакции запись ``Change`` могла бы потеряться.
+    Удаление Django и так выполняет вместе с сигналами в транзакции.
+    """
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class Group(CountersMixin, models.Model):
     title = models.CharField(
         'заголовок сообщества',
         max_length=200,
@@ -12,14 +50,20 @@ class Group(models.Model):
     )
     slug = models.SlugField(unique=True, help_text='уникальное поле')
     description = models.TextField('описание сообщества')
+    posts_count = models.PositiveIntegerField(
+        'число постов', default=0, editable=False
+    )
+
+    counter_fields = ('posts_count',)
 
     def __str__(self):
         return self.title
 
 
-class Post(models.Model):
+class Post(CountersMixin, ChangeLogMixin, models.Model):
     text = models.TextField('текст поста', help_text='текст нового поста')
     pub_date = models.DateTimeField('дата публикации', auto_now_add=True)
+    updated_at = models.DateTimeField('дата изменения', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -36,15 +80,44 @@ class Post(models.Model):
         help_text='Группа, к которой будет относиться пост',
     )
     image = models.ImageField('картинка', upload_to='posts/', blank=True)
+    thumbnail_url = models.CharField(
+        'адрес миниатюры', max_length=255, blank=True, editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        'число комментариев', default=0, editable=False
+    )
+
+    counter_fields = ('comments_count',)
 
     class Meta:
         ordering = ('-pub_date', 'author')
+        indexes = (
+            models.Index(
+                fields=('-pub_date', 'author'), name='post_pub_date_author_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date'), name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date'), name='post_author_pub_date_idx'
+            ),
+            # MAX(updated_at) для валидаторов свежести лент
+            models.Index(fields=('updated_at',), name='post_updated_at_idx'),
+            models.Index(
+                fields=('group', 'updated_at'),
+                name='post_group_updated_at_idx',
+            ),
+            models.Index(
+                fields=('author', 'updated_at'),
+                name='post_author_updated_at_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
 
 
-class Comment(models.Model):
+class Comment(ChangeLogMixin, models.Model):
     text = models.TextField('текст комментария')
     created = models.DateTimeField(
         'дата и время публикации', auto_now_add=True
@@ -64,6 +137,11 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created', 'author')
+        indexes = (
+            models.Index(
+                fields=('post', '-created'), name='comment_post_created_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -83,3 +161,122 @@ class Follow(models.Model):
         related_name='follower',
         verbose_name='подписчик',
     )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='unique_follow'
+            ),
+        )
+
+
+class UserCounters(models.Model):
+    """Счётчики пользователя: у стандартной модели User нет своих полей."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='пользователь',
+    )
+    posts_count = models.PositiveIntegerField('число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'число подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField('число подписок', default=0)
+
+    def __str__(self):
+        return str(self.user)
+
+
+class FeedItem(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='пост',
+    )
+    pub_date = models.DateTimeField('дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='unique_feed_item'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date'), name='feed_user_pub_date_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} <- {self.post}'
+
+
+class SearchToken(models.Model):
+    """Запись обратного индекса: основа слова и пост, где она есть."""
+
+    token = models.CharField('основа слова', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_tokens',
+        verbose_name='пост',
+    )
+    count = models.PositiveIntegerField('число вхождений', default=1)
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('token', 'post'), name='unique_search_token'
+            ),
+        )
+
+    def __str__(self):
+        return self.token
+
+
+class Change(models.Model):
+    """Запись журнала изменений постов и комментариев.
+
+    Номер ``seq`` растёт монотонно, поэтому потребитель помнит последний
+    прочитанный номер и забирает только более поздние записи.
+    """
+
+    POST = 'post'
+    COMMENT = 'comment'
+    MODEL_CHOICES = ((POST, 'пост'), (COMMENT, 'комментарий'))
+
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTION_CHOICES = (
+        (CREATE, 'создание'),
+        (UPDATE, 'изменение'),
+        (DELETE, 'удаление'),
+    )
+
+    seq = models.AutoField('номер изменения', primary_key=True)
+    model = models.CharField('модель', max_length=16, choices=MODEL_CHOICES)
+    object_id = models.PositiveIntegerField('id объекта')
+    action = models.CharField(
+        'действие', max_length=16, choices=ACTION_CHOICES
+    )
+    created = models.DateTimeField('дата изменения', auto_now_add=True)
+
+    class Meta:
+        ordering = ('seq',)
+
+    def __str__(self):
+        return f'{self.seq}: {self.action} {self.model} {self.object_id}'
@@ -0,0 +1,120 @@
+"""Полнотекстовый поиск по постам через собственный обратный индекс.
+
+Текст поста разбивается на слова, слова приводятся к основе лёгким
+стеммером для русского языка, и для каждой основы в ``SearchToken``
+хранится, сколько раз она встречается в посте. Запрос ищет посты
+по индексу основ, поэтому его стоимость зависит от числа совпадений,
+а не от размера таблицы постов.
+"""
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import Post, SearchToken
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'[а-я]')
+MIN_STEM_LENGTH = 3
+MAX_TOKEN_LENGTH = 64
+
+REFLEXIVE_ENDINGS = frozenset(('ся', 'сь'))
+# окончания существительных, прилагательных и глаголов
+ENDINGS = frozenset((
+    'иями', 'ями', 'ами', 'иях', 'ях', 'ах', 'ией', 'ием', 'ей', 'ий',
+    'ой', 'ый', 'ом', 'ем', 'ам', 'ям', 'ов', 'ев', 'ая', 'яя', 'ое',
+    'ее', 'ые', 'ие', 'ую', 'юю', 'ого', 'его', 'ому', 'ему', 'ыми',
+    'ими', 'ых', 'их', 'ешь', 'ете', 'ет', 'ут', 'ют', 'ит', 'ят',
+    'ила', 'ило', 'или', 'ала', 'ало', 'али', 'ел', 'ил', 'ал', 'ть',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+))
+
+
+def _strip(word, endings):
+    # длинные окончания проверяются раньше коротких
+    longest = max(len(word) - MIN_STEM_LENGTH, 0)
+    for length in range(min(4, longest), 0, -1):
+        if word[-length:] in endings:
+            return word[:-length]
+    return word
+
+
+def stem(word):
+    """Привести слово к основе: «постами», «посты» -> «пост»."""
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC_RE.search(word):
+        return word[:MAX_TOKEN_LENGTH]
+    word = _strip(word, REFLEXIVE_ENDINGS)
+    return _strip(word, ENDINGS)[:MAX_TOKEN_LENGTH]
+
+
+def count_terms(text):
+    """Основы слов текста и число их вхождений."""
+    return Counter(
+        stem(word) for word in WORD_RE.findall(text) if len(word) > 1
+    )
+
+
+def index_post(post):
+    """Перестроить записи индекса для одного поста."""
+    with transaction.atomic():
+        SearchToken.objects.filter(post_id=post.pk).delete()
+        SearchToken.objects.bulk_create(
+            SearchToken(post_id=post.pk, token=token, count=count)
+            for token, count in count_terms(post.text).items()
+        )
+
+
+def _index_rows(rows, batch_size):
+    total = 0
+    tokens = []
+    for post_id, text in rows:
+        tokens.extend(
+            SearchToken(post_id=post_id, token=token, count=count)
+            for token, count in count_terms(text).items()
+        )
+        total += 1
+        if len(tokens) >= batch_size:
+            SearchToken.objects.bulk_create(tokens)
+            tokens = []
+    SearchToken.objects.bulk_create(tokens)
+    return total
+
+
+def index_posts(post_ids, batch_size=500):
+    """Проиндексировать новые посты, у которых ещё нет записей."""
+    post_ids = list(post_ids)
+    total = 0
+    for start in range(0, len(post_ids), batch_size):
+        rows = Post.objects.filter(
+            pk__in=post_ids[start:start + batch_size]
+        ).values_list('pk', 'text')
+        total += _index_rows(rows, batch_size)
+    return total
+
+
+def rebuild(batch_size=500):
+    """Переиндексировать все посты, вернуть их число."""
+    SearchToken.objects.all().delete()
+    rows = Post.objects.values_list('pk', 'text').iterator()
+    return _index_rows(rows, batch_size)
+
+
+def search(query):
+    """Посты, содержащие все слова запроса, от более релевантных.
+
+    Релевантность - суммарное число вхождений слов запроса в пост.
+    """
+    terms = set(count_terms(query))
+    if not terms:
+        return Post.objects.none()
+    return (
+        Post.objects.filter(search_tokens__token__in=terms)
+        .annotate(
+            matched=Count('search_tokens'),
+            rank=Sum('search_tokens__count'),
+        )
+        .filter(matched=len(terms))
+        .order_by('-rank', '-pub_date', '-pk')
+    )
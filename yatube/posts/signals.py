@@ -0,0 +1,188 @@
+import threading
+
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from . import caching, changelog, counters, feed, search
+from .models import (
+    Change,
+    Comment,
+    Follow,
+    Group,
+    Post,
+    User,
+    UserCounters,
+)
+
+# посты, удаляемые в этом потоке, и id их комментариев: комментарии
+# удаляются каскадом раньше самого поста. Если удаление откатится, пост
+# останется здесь до конца потока, а расхождение счётчика исправит
+# reconcile_counters
+_cascade = threading.local()
+
+
+def _deleting_posts():
+    if not hasattr(_cascade, 'posts'):
+        _cascade.posts = {}
+    return _cascade.posts
+
+
+@receiver(post_save, sender=User)
+def create_user_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(
+    sender, instance, created, raw=False, update_fields=None, **kwargs
+):
+    # имя автора показано в общей ленте, сообществах, профиле и лентах
+    # подписчиков; переименования редки, поэтому, как при правке
+    # сообществ, сбрасывается поколение. Вход пишет только last_login
+    if created or raw:
+        return
+    if update_fields is not None and not (
+        set(update_fields) & {'username', 'first_name', 'last_name'}
+    ):
+        return
+    caching.invalidate_all()
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    instance._old_group_id, instance._old_group_slug = None, None
+    if not instance._state.adding:
+        instance._old_group_id, instance._old_group_slug = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'group__slug')
+            .first()
+        ) or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_author_posts(instance.author_id, 1)
+        counters.change_group_posts(instance.group_id, 1)
+        return
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if old_group_id != instance.group_id:
+        counters.change_group_posts(old_group_id, -1)
+        counters.change_group_posts(instance.group_id, 1)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleting_post(sender, instance, **kwargs):
+    _deleting_posts()[instance.pk] = []
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_author_posts(instance.author_id, -1)
+    counters.change_group_posts(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, raw=False, **kwargs):
+    # записи удалённого поста удаляются каскадом
+    if not raw:
+        search.index_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_post_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    # счётчик удаляемого поста уходит вместе с ним
+    if instance.post_id not in _deleting_posts():
+        counters.change_post_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, created, **kwargs):
+    if created:
+        caching.invalidate_post(instance)
+    else:
+        caching.invalidate_post(
+            instance,
+            changed_listings=False,
+            old_group_slug=getattr(instance, '_old_group_slug', None),
+        )
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    caching.invalidate_post(instance)
+
+
+@receiver((post_save, post_delete), sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    caching.invalidate_all()
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def invalidate_profile(sender, instance, **kwargs):
+    # кнопка подписки на странице автора зависит от Follow,
+    # состав ленты читателя - тоже
+    caching.invalidate_scopes(
+        caching.profile_scope(instance.author.username),
+        caching.feed_scope(instance.user_id),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        counters.change_follow(instance.user_id, instance.author_id, 1)
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(sender, instance, **kwargs):
+    counters.change_follow(instance.user_id, instance.author_id, -1)
+    feed.remove(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def log_saved(sender, instance, created, **kwargs):
+    changelog.record(instance, Change.CREATE if created else Change.UPDATE)
+
+
+@receiver(post_delete, sender=Comment)
+def log_deleted_comment(sender, instance, **kwargs):
+    cascaded = _deleting_posts().get(instance.post_id)
+    if cascaded is None:
+        changelog.record(instance, Change.DELETE)
+    else:
+        cascaded.append(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def log_deleted_post(sender, instance, **kwargs):
+    # комментарии удалённого поста - одной вставкой перед ним самим
+    changelog.record_many(
+        Change.COMMENT, _deleting_posts().get(instance.pk, ()), Change.DELETE
+    )
+    changelog.record(instance, Change.DELETE)
+
+
+@receiver(post_delete, sender=Post)
+def forget_deleted_post(sender, instance, **kwargs):
+    _deleting_posts().pop(instance.pk, None)
@@ -0,0 +1,45 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from .. import benchmarks
+from ..models import Comment, Follow, Post, User
+
+
+class BenchmarksTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmarks.percentile(values, 0.5), 50)
+        self.assertEqual(benchmarks.percentile(values, 0.99), 99)
+        self.assertEqual(benchmarks.percentile([7], 0.99), 7)
+
+    def test_seed_and_run_all_scenarios(self):
+        sizes = benchmarks.seed(
+            users=10, groups=2, posts=30, comments=20, follows_per_user=3
+        )
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(Post.objects.count(), sizes['posts'])
+        self.assertEqual(Comment.objects.count(), sizes['comments'])
+        self.assertTrue(Follow.objects.exists())
+
+        results = benchmarks.run(iterations=3)
+
+        self.assertEqual(
+            set(results),
+            {
+                'index',
+                'group_posts',
+                'profile',
+                'post_detail',
+                'follow_index',
+                'post_create',
+                'add_comment',
+            },
+        )
+        for name, result in results.items():
+            with self.subTest(scenario=name):
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertGreater(result['queries_max'], 0)
+                self.assertGreater(result['peak_memory_kb'], 0)
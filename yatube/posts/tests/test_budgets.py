@@ -0,0 +1,125 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import enforce_query_budgets
+
+from .. import urls
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@enforce_query_budgets
+class QueryBudgetTests(TestCase):
+    """Страницы укладываются в объявленные бюджеты запросов.
+
+    Кеш очищается перед каждым запросом: бюджет - худший случай.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        posts = [
+            Post.objects.create(
+                text=f'Пост про котов {i}', author=cls.author, group=cls.group
+            )
+            for i in range(15)
+        ]
+        cls.post = posts[0]
+        Comment.objects.bulk_create(
+            Comment(text='Коммент', author=cls.reader, post=post)
+            for post in posts
+            for _ in range(5)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_every_posts_view_declares_budget(self):
+        for pattern in urls.urlpatterns:
+            with self.subTest(view=pattern.name):
+                self.assertTrue(hasattr(pattern.callback, 'query_budget'))
+
+    def test_views_stay_within_budget(self):
+        post_id = self.post.pk
+        cases = (
+            (self.client, 'get', reverse('posts:index'), {}),
+            (self.reader_client, 'get', reverse('posts:index'), {'page': 2}),
+            (
+                self.reader_client,
+                'get',
+                reverse('posts:group_list', args=('group',)),
+                {},
+            ),
+            (
+                self.reader_client,
+                'get',
+                reverse('posts:profile', args=('author',)),
+                {},
+            ),
+            (
+                self.reader_client,
+                'get',
+                reverse('posts:post_detail', args=(post_id,)),
+                {},
+            ),
+            (
+                self.reader_client,
+                'get',
+                reverse('posts:post_comments', args=(post_id,)),
+                {},
+            ),
+            (
+                self.reader_client,
+                'get',
+                reverse('posts:post_search'),
+                {'q': 'коты'},
+            ),
+            (self.reader_client, 'get', reverse('posts:follow_index'), {}),
+            (self.reader_client, 'get', reverse('posts:post_create'), {}),
+            (
+                self.reader_client,
+                'post',
+                reverse('posts:post_create'),
+                {'text': 'Новый', 'group': self.group.pk},
+            ),
+            (
+                self.author_client,
+                'post',
+                reverse('posts:post_edit', args=(post_id,)),
+                {'text': 'Правка', 'group': self.group.pk},
+            ),
+            (
+                self.reader_client,
+                'post',
+                reverse('posts:add_comment', args=(post_id,)),
+                {'text': 'Ещё'},
+            ),
+            (
+                self.reader_client,
+                'get',
+                reverse('posts:profile_unfollow', args=('author',)),
+                {},
+            ),
+            (
+                self.reader_client,
+                'get',
+                reverse('posts:profile_follow', args=('author',)),
+                {},
+            ),
+        )
+        for client, method, url, data in cases:
+            with self.subTest(method=method, url=url):
+                cache.clear()
+                response = getattr(client, method)(url, data)
+                self.assertLess(response.status_code, 400)
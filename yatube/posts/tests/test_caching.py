@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import routers
+from core.testing import clear_caches
+
+from .. import caching
+
+THREADS = 10
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'stale-while-revalidate',
+    }
+}
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    LISTING_CACHE_TIMEOUT=1,
+    LISTING_STALE_TIMEOUT=60,
+    LISTING_LOCK_POLL=0.01,
+)
+class StaleWhileRevalidateTests(SimpleTestCase):
+    def setUp(self):
+        clear_caches()
+        self.renders = 0
+        self.requests = []
+        self.renders_lock = threading.Lock()
+        self.refresher = ThreadPoolExecutor(max_workers=2)
+        patcher = mock.patch.object(caching, 'refresher', self.refresher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.refresher.shutdown)
+
+        @caching.cache_listing('swr')
+        def view(request):
+            with self.renders_lock:
+                self.renders += 1
+                self.requests.append(request)
+                number = self.renders
+            # окно, в которое остальные потоки успевают прийти
+            time.sleep(0.1)
+            return HttpResponse(f'версия {number}')
+
+        self.view = view
+
+    def get(self):
+        return self.view(RequestFactory().get('/')).content.decode()
+
+    def get_concurrently(self):
+        barrier = threading.Barrier(THREADS)
+
+        def request():
+            barrier.wait()
+            return self.get()
+
+        with ThreadPoolExecutor(max_workers=THREADS) as pool:
+            futures = [pool.submit(request) for _ in range(THREADS)]
+            return [future.result() for future in futures]
+
+    def test_cold_page_is_rendered_once(self):
+        contents = self.get_concurrently()
+
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(set(contents), {'версия 1'})
+
+    def test_expired_page_is_served_stale_and_refreshed_once(self):
+        self.get()
+        time.sleep(1.1)
+
+        contents = self.get_concurrently()
+        self.refresher.shutdown(wait=True)
+
+        self.assertEqual(set(contents), {'версия 1'})
+        self.assertEqual(self.renders, 2)
+        self.assertEqual(self.get(), 'версия 2')
+        self.assertEqual(self.renders, 2)
+
+    def test_refresh_uses_anonymous_copy_of_request(self):
+        self.get()
+        time.sleep(1.1)
+        request = RequestFactory().get('/')
+        request.user = mock.sentinel.user
+
+        self.view(request)
+        self.refresher.shutdown(wait=True)
+
+        refresh = self.requests[-1]
+        self.assertIsNot(refresh, request)
+        self.assertEqual(refresh.get_full_path(), '/')
+        self.assertFalse(refresh.user.is_authenticated)
+
+    @override_settings(LISTING_CACHE_TIMEOUT=60)
+    def test_slow_page_is_refreshed_before_expiry(self):
+        self.get()
+        # пересчёт ~0.1 с: при beta=1 срок "приближается" на доли
+        # секунды, при beta=1000 - больше чем на минуту
+        with mock.patch.object(caching.random, 'random', return_value=0.5):
+            self.assertEqual(self.get(), 'версия 1')
+            self.assertEqual(self.renders, 1)
+            with override_settings(LISTING_EARLY_EXPIRY_BETA=1000):
+                self.assertEqual(self.get(), 'версия 1')
+        self.refresher.shutdown(wait=True)
+        self.assertEqual(self.renders, 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReplicaFillTests(SimpleTestCase):
+    def setUp(self):
+        clear_caches()
+        self.pinned = []
+
+        @caching.cache_listing('replica')
+        def view(request):
+            self.pinned.append(routers.is_pinned())
+            return HttpResponse('страница')
+
+        self.view = view
+
+    def test_page_changed_within_lag_is_filled_from_primary(self):
+        caching.invalidate_scopes('replica')
+        # как в запросе за ReplicaPinningMiddleware
+        with routers.pinned_scope():
+            self.view(RequestFactory().get('/'))
+        self.assertEqual(self.pinned, [True])
+
+    @override_settings(REPLICA_PIN_SECONDS=0)
+    def test_settled_page_is_filled_from_replica(self):
+        caching.invalidate_scopes('replica')
+        # как в запросе за ReplicaPinningMiddleware
+        with routers.pinned_scope():
+            self.view(RequestFactory().get('/'))
+        self.assertEqual(self.pinned, [False])
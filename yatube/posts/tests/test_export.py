@@ -0,0 +1,93 @@
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import export
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ExportPostsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            text='Коммент', author=cls.reader, post=cls.posts[0]
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output, ignore_errors=True)
+
+    def export(self, *args):
+        out = io.StringIO()
+        call_command('export_posts', self.output, *args, stdout=out)
+        return out.getvalue()
+
+    def read_ndjson(self, name):
+        with open(os.path.join(self.output, name)) as source:
+            return [json.loads(line) for line in source]
+
+    def test_ndjson_export_of_all_tables(self):
+        report = self.export('--chunk-size', '2')
+
+        posts = self.read_ndjson('posts.ndjson')
+        self.assertEqual(
+            [post['id'] for post in posts], [post.pk for post in self.posts]
+        )
+        self.assertEqual(posts[0]['author__username'], 'author')
+        self.assertEqual(posts[0]['group__slug'], 'group')
+        self.assertEqual(len(self.read_ndjson('comments.ndjson')), 1)
+        self.assertEqual(len(self.read_ndjson('follows.ndjson')), 1)
+        self.assertEqual(len(self.read_ndjson('groups.ndjson')), 1)
+        self.assertIn('posts: строк 5', report)
+        self.assertIn('строк/с', report)
+
+    def test_gzipped_csv_export(self):
+        self.export('--format', 'csv', '--gzip', '--tables', 'posts')
+
+        with gzip.open(os.path.join(self.output, 'posts.csv.gz'), 'rt') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], list(export.TABLES['posts'][1]))
+        self.assertEqual(len(rows), len(self.posts) + 1)
+
+    def test_export_reads_in_keyset_chunks(self):
+        # три порции по две строки и пустой запрос в конце
+        with self.assertNumQueries(4):
+            chunks = list(export.iter_chunks('posts', chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+
+    def test_resume_continues_after_last_id(self):
+        self.export('--gzip', '--tables', 'posts', '--chunk-size', '2')
+        path = os.path.join(self.output, 'posts.ndjson.gz')
+        # обрыв посреди порции оставляет в файле недописанный хвост
+        with open(path, 'ab') as target:
+            target.write(b'\x1f\x8b broken')
+        new_post = Post.objects.create(text='Новый', author=self.author)
+
+        report = self.export('--gzip', '--tables', 'posts', '--resume')
+
+        with gzip.open(path, 'rt') as source:
+            ids = [json.loads(line)['id'] for line in source]
+        self.assertEqual(ids, [post.pk for post in self.posts] + [new_post.pk])
+        self.assertIn('posts: строк 1', report)
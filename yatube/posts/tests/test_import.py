@@ -0,0 +1,134 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from .. import search
+from ..models import (
+    Change,
+    Comment,
+    FeedItem,
+    Follow,
+    Group,
+    Post,
+    UserCounters,
+)
+
+User = get_user_model()
+
+
+class ImportPostsTests(TestCase):
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output, ignore_errors=True)
+
+    def import_posts(self, *args):
+        out = io.StringIO()
+        call_command('import_posts', *args, stdout=out)
+        return out.getvalue()
+
+    def write(self, name, content):
+        path = os.path.join(self.output, name)
+        with open(path, 'w') as target:
+            target.write(content)
+        return path
+
+    def test_round_trip_through_export(self):
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        posts = [
+            Post.objects.create(
+                text=f'Пост про котов {i}', author=author, group=group
+            )
+            for i in range(3)
+        ]
+        Comment.objects.create(text='Коммент', author=reader, post=posts[0])
+        Follow.objects.create(user=reader, author=author)
+        pub_dates = [post.pub_date for post in posts]
+        call_command(
+            'export_posts', self.output, '--gzip', stdout=io.StringIO()
+        )
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        Group.objects.all().delete()
+        since = Change.objects.values_list('seq', flat=True).last()
+
+        report = self.import_posts(self.output, '--batch-size', '2')
+
+        imported = list(Post.objects.order_by('pub_date'))
+        self.assertEqual([post.pub_date for post in imported], pub_dates)
+        self.assertEqual(imported[0].group.slug, 'group')
+        self.assertEqual(imported[0].comments.get().author, reader)
+        self.assertTrue(Follow.objects.filter(user=reader).exists())
+        self.assertEqual(UserCounters.objects.get(user=author).posts_count, 3)
+        self.assertEqual(Post.objects.get(pk=imported[0].pk).comments_count, 1)
+        self.assertEqual(len(search.search('котов')), 3)
+        self.assertEqual(FeedItem.objects.filter(user=reader).count(), 3)
+        self.assertEqual(Change.objects.filter(seq__gt=since).count(), 4)
+        self.assertIn('posts.ndjson.gz: загружено строк 3', report)
+        self.assertIn('строк/с', report)
+
+    def test_csv_import_creates_missing_users(self):
+        path = self.write(
+            'posts.csv',
+            'text,pub_date,author__username,group__slug\n'
+            'Первый,2022-01-01T10:00:00,newbie,\n'
+            'Второй,,newbie,\n',
+        )
+
+        self.import_posts(path)
+
+        newbie = User.objects.get(username='newbie')
+        self.assertFalse(newbie.has_usable_password())
+        self.assertEqual(newbie.posts.count(), 2)
+        self.assertEqual(
+            newbie.posts.get(text='Первый').pub_date.year, 2022
+        )
+
+    def test_unknown_users_are_skipped_without_creation(self):
+        path = self.write(
+            'posts.ndjson',
+            '{"text": "Пост", "author__username": "ghost"}\n',
+        )
+
+        report = self.import_posts(path, '--no-create-users')
+
+        self.assertFalse(Post.objects.exists())
+        self.assertIn('posts: пропущено строк 1', report)
+
+    def test_malformed_date_names_file_and_line(self):
+        path = self.write(
+            'posts.csv',
+            'text,pub_date,author__username,group__slug\n'
+            'Первый,2022-01-01T10:00:00,newbie,\n'
+            'Второй,вчера,newbie,\n',
+        )
+
+        with self.assertRaisesMessage(CommandError, f'{path}, строка 3'):
+            self.import_posts(path)
+
+    def test_existing_and_repeated_follows_are_not_counted(self):
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=author)
+        path = self.write(
+            'follows.ndjson',
+            '{"user__username": "reader", "author__username": "author"}\n'
+            '{"user__username": "author", "author__username": "reader"}\n'
+            '{"user__username": "author", "author__username": "reader"}\n',
+        )
+
+        report = self.import_posts(path)
+
+        self.assertIn('follows.ndjson: загружено строк 1', report)
+        self.assertIn('follows: пропущено строк 2', report)
+        self.assertEqual(
+            UserCounters.objects.get(user=reader).followers_count, 1
+        )
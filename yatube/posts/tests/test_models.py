@@ -1,7 +1,20 @@
+import json
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import (
+    DatabaseError,
+    IntegrityError,
+    connection,
+    transaction,
+)
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from ..models import Group, Post
+from .. import changelog
+from ..models import Change, Comment, Follow, Group, Post, UserCounters
 
 User = get_user_model()
 
@@ -86,3 +99,218 @@ class GroupModelTests(TestCase):
                 self.assertEqual(
                     group._meta.get_field(field).help_text, expected_value
                 )
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def assertCounters(self, user, **expected):
+        counters = UserCounters.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(counters, field), value)
+
+    def test_post_counters_follow_create_and_delete(self):
+        post = Post.objects.create(
+            text='Тестовый пост', author=self.author, group=self.group
+        )
+        self.assertCounters(self.author, posts_count=1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+
+        post.delete()
+        self.assertCounters(self.author, posts_count=0)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_group_change_moves_post_counter(self):
+        other_group = Group.objects.create(
+            title='Другая группа', slug='other-slug', description='-'
+        )
+        post = Post.objects.create(
+            text='Тестовый пост', author=self.author, group=self.group
+        )
+
+        post.group = other_group
+        post.save()
+
+        self.group.refresh_from_db()
+        other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(other_group.posts_count, 1)
+
+    def test_comment_and_follow_counters(self):
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        Comment.objects.create(text='Коммент', author=self.reader, post=post)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertCounters(self.author, followers_count=1)
+        self.assertCounters(self.reader, following_count=1)
+
+        follow.delete()
+        self.assertCounters(self.author, followers_count=0)
+        self.assertCounters(self.reader, following_count=0)
+
+    def test_post_delete_skips_comment_counter_updates(self):
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        for _ in range(3):
+            Comment.objects.create(
+                text='Коммент', author=self.reader, post=post
+            )
+        other = Post.objects.create(text='Другой пост', author=self.author)
+        Comment.objects.create(text='Коммент', author=self.reader, post=other)
+
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        Comment.objects.filter(post=other).delete()
+
+        updates = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE')
+            and 'comments_count' in query['sql']
+        ]
+        self.assertEqual(updates, [])
+        other.refresh_from_db()
+        self.assertEqual(other.comments_count, 0)
+
+    def test_stale_instance_save_keeps_counters(self):
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        Comment.objects.create(text='Коммент', author=self.reader, post=post)
+
+        post.text = 'Изменённый пост'
+        post.save()
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_reconcile_counters_fixes_drift(self):
+        post = Post.objects.create(
+            text='Тестовый пост', author=self.author, group=self.group
+        )
+        Comment.objects.create(text='Коммент', author=self.reader, post=post)
+        UserCounters.objects.filter(user=self.author).update(posts_count=7)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=0)
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+        UserCounters.objects.filter(user=self.reader).delete()
+
+        call_command('reconcile_counters', stdout=StringIO())
+
+        self.assertCounters(self.author, posts_count=1)
+        self.assertCounters(self.reader, posts_count=0)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+
+class FollowModelTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_follow_is_unique(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.reader, author=self.author)
+
+
+class ChangeLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='auth')
+
+    def logged(self, since):
+        return list(
+            Change.objects.filter(seq__gt=since).values_list(
+                'model', 'object_id', 'action'
+            )
+        )
+
+    def test_post_and_comment_changes_are_logged_in_order(self):
+        since = changelog.latest_seq()
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            text='Коммент', author=self.author, post=post
+        )
+        post.text = 'Правка'
+        post.save()
+        post_id, comment_id = post.pk, comment.pk
+        post.delete()
+
+        self.assertEqual(
+            self.logged(since),
+            [
+                ('post', post_id, 'create'),
+                ('comment', comment_id, 'create'),
+                ('post', post_id, 'update'),
+                ('comment', comment_id, 'delete'),
+                ('post', post_id, 'delete'),
+            ],
+        )
+
+    def test_cascaded_comment_deletes_are_logged_in_one_insert(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment_ids = [
+            Comment.objects.create(
+                text='Коммент', author=self.author, post=post
+            ).pk
+            for _ in range(3)
+        ]
+        post_id, since = post.pk, changelog.latest_seq()
+
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+
+        inserts = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('INSERT INTO "posts_change"')
+        ]
+        self.assertEqual(len(inserts), 2)
+        self.assertCountEqual(
+            self.logged(since)[:-1],
+            [('comment', pk, 'delete') for pk in comment_ids],
+        )
+        self.assertEqual(self.logged(since)[-1], ('post', post_id, 'delete'))
+
+    def test_failed_log_write_rolls_back_the_save(self):
+        with mock.patch.object(
+            changelog, 'record', side_effect=DatabaseError
+        ), self.assertRaises(DatabaseError):
+            Post.objects.create(text='Пост', author=self.author)
+
+        self.assertFalse(Post.objects.exists())
+
+    def test_edit_moves_updated_at(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        created_at = post.updated_at
+        post.text = 'Правка'
+        post.save()
+
+        self.assertGreater(post.updated_at, created_at)
+
+    def test_changes_since_command(self):
+        since = changelog.latest_seq()
+        post = Post.objects.create(text='Пост', author=self.author)
+        out = StringIO()
+
+        call_command('changes_since', since, stdout=out, stderr=StringIO())
+
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [(row['model'], row['id'], row['action']) for row in rows],
+            [('post', post.pk, 'create')],
+        )
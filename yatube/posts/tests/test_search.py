@@ -0,0 +1,118 @@
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Post, SearchToken
+
+User = get_user_model()
+
+
+class StemTests(TestCase):
+    def test_word_forms_share_stem(self):
+        forms = ('пост', 'поста', 'посты', 'постами', 'постов')
+        self.assertEqual({search.stem(word) for word in forms}, {'пост'})
+
+    def test_case_and_yo_are_normalized(self):
+        self.assertEqual(search.stem('Ёлки'), search.stem('елка'))
+
+    def test_latin_words_are_kept(self):
+        self.assertEqual(search.stem('Django'), 'django')
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.cats = Post.objects.create(
+            text='Кошки любят спать. Кошка спала весь день.',
+            author=cls.author,
+        )
+        cls.dogs = Post.objects.create(
+            text='Собаки любят гулять, а кошки нет.', author=cls.author
+        )
+
+    def test_saved_post_is_indexed(self):
+        self.assertTrue(
+            SearchToken.objects.filter(post=self.cats, token='кошк').exists()
+        )
+
+    def test_search_ranks_by_term_frequency(self):
+        self.assertEqual(
+            list(search.search('кошками')), [self.cats, self.dogs]
+        )
+
+    def test_search_requires_all_terms(self):
+        self.assertEqual(list(search.search('кошки гулять')), [self.dogs])
+
+    def test_edited_post_is_reindexed(self):
+        post = Post.objects.get(pk=self.dogs.pk)
+        post.text = 'Собаки любят гулять.'
+        post.save()
+
+        self.assertEqual(list(search.search('кошки')), [self.cats])
+
+    def test_deleted_post_leaves_index(self):
+        Post.objects.get(pk=self.cats.pk).delete()
+
+        self.assertFalse(
+            SearchToken.objects.filter(post_id=self.cats.pk).exists()
+        )
+
+    def test_rebuild_command_restores_index(self):
+        SearchToken.objects.all().delete()
+
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        self.assertEqual(list(search.search('собака')), [self.dogs])
+
+    def test_admin_search_uses_index(self):
+        request = RequestFactory().get('/admin/posts/post/')
+        queryset, use_distinct = site._registry[Post].get_search_results(
+            request, Post.objects.all(), 'гулять'
+        )
+
+        self.assertEqual(list(queryset), [self.dogs])
+        self.assertFalse(use_distinct)
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост про погоду номер {i}', author=cls.author)
+            for i in range(settings.POSTS_PER_PAGE + 2)
+        )
+        search.rebuild()
+        cls.other = Post.objects.create(text='Другое', author=cls.author)
+
+    def test_search_page_shows_matches(self):
+        response = self.client.get(
+            reverse('posts:post_search'), {'q': 'погода'}
+        )
+
+        self.assertTemplateUsed(response, 'posts/search.html')
+        self.assertEqual(
+            response.context['page_obj'].paginator.count,
+            settings.POSTS_PER_PAGE + 2,
+        )
+        self.assertNotIn(self.other, response.context['page_obj'])
+
+    def test_search_pages_keep_query(self):
+        response = self.client.get(
+            reverse('posts:post_search'), {'q': 'погода', 'page': 2}
+        )
+
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertContains(response, '?q=%D0%BF%D0%BE%D0%B3%D0%BE%D0%B4')
+
+    def test_empty_query_finds_nothing(self):
+        response = self.client.get(reverse('posts:post_search'))
+
+        self.assertEqual(len(response.context['page_obj']), 0)
@@ -37,6 +37,7 @@ class PostURLTests(TestCase):
             f'/group/{self.group.slug}/',
             f'/profile/{self.author.username}/',
             f'/posts/{self.post.id}/',
+            f'/posts/{self.post.id}/comments/',
         )
 
         for url in pages_available_to_all_users:
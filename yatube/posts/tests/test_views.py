@@ -1,16 +1,32 @@
+import datetime as dt
 import shutil
 import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    Client,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
 from django.urls import reverse
+from PIL import Image
 
+from core import utils
+from core.testing import clear_caches
+
+from .. import caching, feed, thumbnails
 from ..forms import PostForm
-from ..models import Comment, Follow, Group, Post
+from ..models import Comment, FeedItem, Follow, Group, Post
 
 User = get_user_model()
 
@@ -97,6 +113,22 @@ class PostViewTests(TestCase):
         for article in page_objects:
             self.assertEqual(article.author, self.author)
 
+    def test_pages_of_user_without_counters_row(self):
+        User.objects.bulk_create([User(username='loaded')])
+        loaded = User.objects.get(username='loaded')
+        post = Post.objects.create(text='Пост без счётчиков', author=loaded)
+
+        # строка счётчиков создаётся один раз, сверх бюджета страницы
+        with self.assertLogs('yatube.queries', 'WARNING'):
+            response = self.client.get(
+                reverse('posts:profile', kwargs={'username': 'loaded'})
+            )
+        self.assertContains(response, 'Всего постов: 1')
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, '<span>1</span>')
+
     def test_post_detail_page_shows_correct_context(self):
         response = self.authorized_client.get(
             reverse(
@@ -237,6 +269,7 @@ class ViewsPaginatorTests(TestCase):
     def setUp(self):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.author)
+        cache.clear()
 
     def test_pages_paginator_works(self):
         page_names = (
@@ -264,6 +297,62 @@ class ViewsPaginatorTests(TestCase):
                     self.EXPECTED_ON_SECOND_PAGE,
                 )
 
+    @override_settings(PAGINATION_MODE='cursor')
+    def test_pages_cursor_paginator_works(self):
+        page_names = (
+            reverse('posts:index'),
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': self.group.slug},
+            ),
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.author.username},
+            ),
+        )
+        expected_order = sorted(
+            self.posts, key=lambda post: (post.pub_date, post.pk), reverse=True
+        )
+
+        for page_name in page_names:
+            with self.subTest(page_name=page_name):
+                response = self.authorized_client.get(page_name)
+                first_page = response.context['page_obj']
+                self.assertEqual(len(first_page), settings.POSTS_PER_PAGE)
+                self.assertFalse(first_page.has_previous())
+                self.assertTrue(first_page.has_next())
+                self.assertEqual(
+                    list(first_page), expected_order[:settings.POSTS_PER_PAGE]
+                )
+
+                response = self.authorized_client.get(
+                    page_name + f'?after={first_page.next_cursor}'
+                )
+                second_page = response.context['page_obj']
+                self.assertEqual(
+                    list(second_page),
+                    expected_order[settings.POSTS_PER_PAGE:],
+                )
+                self.assertFalse(second_page.has_next())
+                self.assertTrue(second_page.has_previous())
+
+                response = self.authorized_client.get(
+                    page_name + f'?before={second_page.previous_cursor}'
+                )
+                self.assertEqual(
+                    list(response.context['page_obj']),
+                    expected_order[:settings.POSTS_PER_PAGE],
+                )
+
+    @override_settings(PAGINATION_MODE='cursor')
+    def test_cursor_paginator_ignores_broken_cursor(self):
+        response = self.authorized_client.get(
+            reverse('posts:index') + '?after=not-a-cursor'
+        )
+        self.assertEqual(
+            len(response.context['page_obj']), settings.POSTS_PER_PAGE
+        )
+
 
 class PostImagesTest(TestCase):
     @classmethod
@@ -331,6 +420,138 @@ class PostImagesTest(TestCase):
         self.assertEqual(response.context['post'].image, 'posts/' + image_name)
 
 
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_generate_records_thumbnail_url(self):
+        post = Post.objects.create(
+            text='Тестовый пост',
+            author=self.author,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        self.client.get(reverse('posts:index'))
+
+        url = thumbnails.generate(post.id)
+
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnail_url, url)
+        self.assertTrue(url.endswith('_960x339.jpg'))
+        for name in (
+            reverse('posts:index'),
+            reverse('posts:post_detail', kwargs={'post_id': post.id}),
+        ):
+            with self.subTest(name=name):
+                self.assertContains(self.client.get(name), url)
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_backfill_command_fills_missing_thumbnails(self):
+        post = Post.objects.create(
+            text='Пост из админки',
+            author=self.author,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        lost = Post.objects.create(
+            text='Картинка потеряна', author=self.author, image='posts/no.gif'
+        )
+        Post.objects.create(text='Без картинки', author=self.author)
+        out = StringIO()
+
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            call_command('backfill_thumbnails', stdout=out)
+
+        post.refresh_from_db()
+        lost.refresh_from_db()
+        self.assertTrue(post.thumbnail_url.endswith('_960x339.jpg'))
+        self.assertEqual(lost.thumbnail_url, '')
+        self.assertIn('Не удалось подготовить: 1', out.getvalue())
+        self.assertIn('Миниатюр подготовлено: 1', out.getvalue())
+
+    def test_render_thumbnail_crops_to_card_size(self):
+        data = thumbnails.render_thumbnail(SMALL_GIF)
+        self.assertEqual(Image.open(BytesIO(data)).size, thumbnails.CARD_SIZE)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=True)
+class PostThumbnailPipelineTest(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_post_create_schedules_thumbnail(self):
+        author = User.objects.create_user(username='author')
+        self.client.force_login(author)
+
+        self.client.post(
+            reverse('posts:post_create'),
+            {
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile(
+                    'small.gif', SMALL_GIF, 'image/gif'
+                ),
+            },
+        )
+        thumbnails.pipeline.join()
+
+        post = Post.objects.get()
+        self.assertTrue(post.thumbnail_url.endswith('_960x339.jpg'))
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='Старый текст', author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_card_is_reused_until_post_is_edited(self):
+        self.reader_client.get(reverse('posts:follow_index'))
+
+        # изменение без обновления updated_at не видно: карточка из кеша
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Старый текст')
+
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            {'text': 'Новый текст'},
+        )
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Новый текст')
+        self.assertNotContains(response, 'Старый текст')
+
+
 class CommentsViewTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -357,6 +578,115 @@ class CommentsViewTest(TestCase):
         self.assertEqual(first_comment, self.comment)
 
 
+@override_settings(COMMENTS_PER_PAGE=2)
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Мой пост', author=cls.author)
+        cls.comments = [
+            Comment.objects.create(
+                text=f'Коммент {i}', author=cls.author, post=cls.post
+            )
+            for i in range(5)
+        ]
+        # от новых к старым, как на странице
+        cls.comments.reverse()
+
+    def test_post_detail_shows_first_comments_only(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+
+        comments = response.context['comments']
+        self.assertEqual(list(comments), self.comments[:2])
+        self.assertTrue(comments.has_next())
+        self.assertContains(
+            response,
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+        )
+
+    def test_comments_fragment_continues_after_cursor(self):
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        shown = []
+        cursor = None
+        while True:
+            params = {'after': cursor} if cursor else {}
+            response = self.client.get(url, params)
+            self.assertTemplateUsed(response, 'posts/includes/comments.html')
+            page = response.context['comments']
+            shown.extend(page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(shown, self.comments)
+
+    def test_comments_json_batch(self):
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        first = self.client.get(url, {'format': 'json'}).json()
+        second = self.client.get(
+            url,
+            {'after': first['next_cursor']},
+            HTTP_ACCEPT='application/json',
+        ).json()
+
+        self.assertEqual(
+            [comment['id'] for comment in first['comments']],
+            [comment.pk for comment in self.comments[:2]],
+        )
+        self.assertEqual(first['comments'][0]['author'], 'author')
+        self.assertIn(first['next_cursor'], first['next'])
+        self.assertEqual(
+            [comment['id'] for comment in second['comments']],
+            [comment.pk for comment in self.comments[2:4]],
+        )
+
+    def test_comments_of_unknown_post_return_404(self):
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class PostDetailQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group
+        )
+
+    def assert_detail_queries(self, comments_count):
+        commenters = [
+            User.objects.create_user(username=f'reader{comments_count}_{i}')
+            for i in range(comments_count)
+        ]
+        Comment.objects.bulk_create(
+            Comment(text='Коммент', author=commenter, post=self.post)
+            for commenter in commenters
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        # валидатор свежести, пост с автором и группой, комментарии
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(
+            len(response.context['comments']),
+            Comment.objects.filter(post=self.post).count(),
+        )
+
+    def test_post_detail_queries_with_one_comment(self):
+        self.assert_detail_queries(1)
+
+    def test_post_detail_queries_do_not_grow_with_comments(self):
+        self.assert_detail_queries(10)
+
+
 class CachingViewTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -374,21 +704,347 @@ class CachingViewTest(TestCase):
         response = self.authorized_client.get(reverse('posts:index'))
         expected_cached_content = response.content
 
-        # check that there is no any records anymore in db
-        Post.objects.all().delete()
-        self.assertEqual(Post.objects.count(), 0)
+        # change records without model signals
+        Post.objects.all().update(text='Изменённый пост')
 
-        # check that response.content still has records
+        # check that response.content still has old records
         response = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response.content, expected_cached_content)
 
         cache.clear()
 
-        # check that no we don't have any records in response too
+        # check that now we get fresh records
         response = self.authorized_client.get(reverse('posts:index'))
-        self.assertNotIn(self.post, response.context['page_obj'])
         self.assertNotEqual(response.content, expected_cached_content)
 
+    def test_new_post_invalidates_cached_pages(self):
+        group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.author.username},
+            ),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+
+        new_post = Post.objects.create(
+            text='Новый пост', author=self.author, group=group
+        )
+
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertEqual(
+                    response.context['page_obj'].object_list[0], new_post
+                )
+
+    def test_edit_invalidates_only_pages_with_post(self):
+        for _ in range(settings.POSTS_PER_PAGE):
+            Post.objects.create(text='Новый пост', author=self.author)
+        first_page = self.authorized_client.get(reverse('posts:index'))
+        second_page = self.authorized_client.get(
+            reverse('posts:index') + '?page=2'
+        )
+
+        self.post.text = 'Изменённый пост'
+        self.post.save()
+
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response.content, first_page.content)
+        # из кеша: рендерились только персональные фрагменты
+        self.assertNotIn('page_obj', response.context)
+        response = self.authorized_client.get(
+            reverse('posts:index') + '?page=2'
+        )
+        self.assertNotEqual(response.content, second_page.content)
+        self.assertContains(response, 'Изменённый пост')
+
+    def test_author_rename_invalidates_cached_pages(self):
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.author)
+        follower_client = Client()
+        follower_client.force_login(follower)
+        urls = (
+            reverse('posts:index'),
+            reverse(
+                'posts:profile',
+                kwargs={'username': self.author.username},
+            ),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        follower_client.get(reverse('posts:follow_index'))
+
+        self.author.first_name = 'Лев'
+        self.author.last_name = 'Толстой'
+        self.author.save()
+
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Лев Толстой')
+        response = follower_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Лев Толстой')
+
+    def test_out_of_range_pages_are_not_cached(self):
+        url = reverse('posts:index')
+        for page in ('0', '99999', '-1'):
+            self.authorized_client.get(f'{url}?page={page}')
+
+        self.post.text = 'Изменённый пост'
+        self.post.save()
+
+        for page in ('0', '99999', '-1'):
+            with self.subTest(page=page):
+                response = self.authorized_client.get(f'{url}?page={page}')
+                self.assertContains(response, 'Изменённый пост')
+
+    def test_deleted_post_disappears_from_index(self):
+        self.authorized_client.get(reverse('posts:index'))
+
+        Post.objects.get(pk=self.post.pk).delete()
+
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotIn(self.post, response.context['page_obj'])
+
+
+class PersonalFragmentsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_users_share_cached_body_with_own_header(self):
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.author_client.get(url)
+
+        response = self.reader_client.get(url)
+
+        self.assertNotIn('page_obj', response.context)
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertNotContains(response, 'Пользователь: author')
+        self.assertContains(response, 'Подписаться')
+        self.assertNotContains(response, 'Редактировать пост')
+        self.assertIn('private', response['Cache-Control'])
+        response = self.client.get(url)
+        self.assertNotIn('page_obj', response.context)
+        self.assertContains(response, 'Войти')
+        self.assertNotContains(response, 'Подписаться')
+
+    def test_post_detail_fragments_depend_on_user(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.author_client.get(url)
+        self.assertContains(response, 'редактировать пост')
+        self.assertContains(response, 'Добавить комментарий')
+        response = self.client.get(url)
+        self.assertNotContains(response, 'редактировать пост')
+        self.assertNotContains(response, 'Добавить комментарий')
+
+    def test_marker_in_post_text_is_not_stitched(self):
+        Post.objects.create(
+            text='<!--personal:header:e30=-->', author=self.author
+        )
+        response = self.reader_client.get(reverse('posts:index'))
+        self.assertContains(response, '&lt;!--personal:header:e30=--&gt;')
+        self.assertContains(response, 'Пользователь: reader', count=1)
+
+
+class ListingCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        clear_caches()
+
+    def test_count_is_cached_until_new_post(self):
+        posts = Post.objects.all()
+        self.assertEqual(
+            caching.get_listing_count(caching.INDEX_SCOPE, posts), 1
+        )
+        with self.assertNumQueries(0):
+            caching.get_listing_count(caching.INDEX_SCOPE, posts)
+
+        Post.objects.create(text='Новый пост', author=self.author)
+
+        self.assertEqual(
+            caching.get_listing_count(caching.INDEX_SCOPE, posts), 2
+        )
+
+    def test_follow_resets_feed_count(self):
+        scope = caching.feed_scope(self.reader.pk)
+        self.assertEqual(
+            caching.get_listing_count(scope, feed.get_feed(self.reader)), 0
+        )
+
+        Follow.objects.create(user=self.reader, author=self.author)
+
+        self.assertEqual(
+            caching.get_listing_count(scope, feed.get_feed(self.reader)), 1
+        )
+
+    @override_settings(LISTING_COUNT_MODE='approximate', LISTING_MAX_PAGES=1)
+    def test_approximate_count_uses_table_statistics(self):
+        for _ in range(settings.POSTS_PER_PAGE * 2):
+            Post.objects.create(text='Новый пост', author=self.author)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        with self.assertNumQueries(1):
+            count = caching.get_listing_count(
+                caching.INDEX_SCOPE, Post.objects.all()
+            )
+        self.assertEqual(count, settings.POSTS_PER_PAGE)
+        self.assertEqual(
+            utils.estimate_rows(Post), settings.POSTS_PER_PAGE * 2 + 1
+        )
+
+    @override_settings(LISTING_COUNT_MODE='approximate', LISTING_MAX_PAGES=1)
+    def test_counter_listings_are_capped(self):
+        group = Group.objects.create(title='Группа', slug='group')
+        for _ in range(settings.POSTS_PER_PAGE * 2):
+            Post.objects.create(
+                text='Новый пост', author=self.author, group=group
+            )
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ),
+        )
+
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    response.context['page_obj'].paginator.num_pages, 1
+                )
+
+
+class ConditionalViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_unchanged_pages_return_304(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_changed_pages_are_rendered(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Правка'
+        post.save()
+
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_deleted_older_post_changes_listings(self):
+        older = Post.objects.create(
+            text='Старый пост', author=self.author, group=self.group
+        )
+        Post.objects.filter(pk=older.pk).update(
+            updated_at=self.post.updated_at - dt.timedelta(days=1)
+        )
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls[:2]}
+        older.delete()
+
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_deleted_post_moves_listing_last_modified(self):
+        older = Post.objects.create(
+            text='Старый пост', author=self.author, group=self.group
+        )
+        Post.objects.filter(pk=older.pk).update(
+            updated_at=self.post.updated_at - dt.timedelta(days=1)
+        )
+        stamps = {
+            url: self.client.get(url)['Last-Modified']
+            for url in self.urls[:3]
+        }
+        # удаление на минуту позже: Last-Modified с точностью до секунды
+        later = time.time_ns() + 60 * 10**9
+        with mock.patch.object(caching, '_new_version', return_value=later):
+            older.delete()
+
+        for url, stamp in stamps.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=stamp)
+                self.assertEqual(response.status_code, 200)
+
+    def test_new_comment_changes_post_detail(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(
+            text='Коммент', author=self.reader, post=self.post
+        )
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_pages_differ_per_user(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.client.force_login(self.reader)
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.client.logout()
+                self.assertEqual(response.status_code, 200)
+
+    def test_follow_changes_profile(self):
+        self.client.force_login(self.reader)
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        etag = self.client.get(url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
 
 class FollowViewTest(TestCase):
     @classmethod
@@ -406,6 +1062,7 @@ class FollowViewTest(TestCase):
         self.authorized_author.force_login(self.author)
         self.authorized_user = Client()
         self.authorized_user.force_login(self.user)
+        cache.clear()
 
     def test_user_sees_author_posts_if_follows(self):
         Follow.objects.create(user=self.user, author=self.author)
@@ -470,6 +1127,69 @@ class FollowViewTest(TestCase):
         following_posts_count = len(response.context['page_obj'].object_list)
         self.assertEqual(following_posts_count, 0)
 
+    def test_new_post_is_fanned_out_to_followers(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.user, post=new_post).exists()
+        )
+        response = self.authorized_user.get(reverse('posts:follow_index'))
+        first_post = response.context['page_obj'].object_list[0]
+        self.assertEqual(first_post, new_post)
+
+    @override_settings(FEED_MAX_ITEMS=2)
+    def test_fan_out_keeps_feed_within_limit(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        new_posts = [
+            Post.objects.create(text=f'Новый пост {i}', author=self.author)
+            for i in range(3)
+        ]
+
+        self.assertQuerysetEqual(
+            FeedItem.objects.filter(user=self.user).values_list(
+                'post', flat=True
+            ),
+            [post.pk for post in reversed(new_posts[1:])],
+            transform=int,
+        )
+
+    def test_unfollow_prunes_feed(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        self.authorized_user.get(
+            reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': self.author.username},
+            )
+        )
+
+        self.assertFalse(FeedItem.objects.filter(user=self.user).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_popular_author_posts_are_read_on_demand(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+
+        self.assertFalse(FeedItem.objects.filter(user=self.user).exists())
+        response = self.authorized_user.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.author_post]
+        )
+
+    def test_posts_of_former_celebrity_are_fanned_out(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        with override_settings(FEED_FANOUT_LIMIT=0):
+            new_post = Post.objects.create(
+                text='Новый пост', author=self.author
+            )
+        # список популярных авторов пересчитывается по истечении срока
+        cache.delete(feed.CELEBRITIES_CACHE_KEY)
+
+        self.assertNotIn(self.author.pk, feed.get_celebrity_ids())
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.user, post=new_post).exists()
+        )
+
     def test_user_redirected_to_author_page_after_follow(self):
         response = self.authorized_user.get(
             reverse(
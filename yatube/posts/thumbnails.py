@@ -0,0 +1,178 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Пост ставится в локальную очередь после сохранения в ``post_create``
+и ``post_edit``. Потоки-обработчики читают картинку из хранилища,
+отдают декодирование и масштабирование в пул процессов, сохраняют
+результат и записывают его адрес в ``Post.thumbnail_url``. Шаблонам
+остаётся только вывести готовый адрес.
+
+Посты, сохранённые в обход форм (админка, ``import_posts``, миграция
+0011), и задания, потерянные с очередью в памяти, догоняет
+``backfill()`` - команда ``backfill_thumbnails``.
+"""
+import io
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from core import metrics, routers
+
+from . import caching, changelog
+from .models import Change, Post
+
+logger = logging.getLogger(__name__)
+
+CARD_SIZE = (960, 339)
+
+
+def render_thumbnail(data, size=CARD_SIZE):
+    """Обрезать по центру и вписать картинку в size, вернуть JPEG.
+
+    Выполняется в пуле процессов, поэтому работает только с байтами.
+    """
+    image = Image.open(io.BytesIO(data))
+    image = ImageOps.fit(image.convert('RGB'), size, Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=85, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def _thumbnail_name(post, size):
+    stem = os.path.splitext(os.path.basename(post.image.name))[0]
+    width, height = size
+    return f'thumbnails/{post.pk}/{stem}_{width}x{height}.jpg'
+
+
+def _count(result):
+    metrics.registry.inc('yatube_thumbnails_total', {'result': result})
+
+
+def generate(post_id, render=render_thumbnail):
+    """Подготовить миниатюру поста и записать её адрес."""
+    posts = Post.objects.select_related('author', 'group')
+    post = posts.filter(pk=post_id).first()
+    if post is None or not post.image:
+        _count('skipped')
+        return None
+    with post.image.open('rb') as source:
+        data = source.read()
+    name = default_storage.save(
+        _thumbnail_name(post, CARD_SIZE), ContentFile(render(data))
+    )
+    post.thumbnail_url = default_storage.url(name)
+    post.updated_at = timezone.now()
+    with transaction.atomic():
+        Post.objects.filter(pk=post_id).update(
+            thumbnail_url=post.thumbnail_url, updated_at=post.updated_at
+        )
+        changelog.record(post, Change.UPDATE)
+    caching.invalidate_post(post, changed_listings=False)
+    _count('generated')
+    return post.thumbnail_url
+
+
+def _process(post_id, render=render_thumbnail):
+    try:
+        close_old_connections()
+        # пост только что записан, реплика могла его не получить
+        with routers.use_primary():
+            generate(post_id, render=render)
+    except Exception:
+        _count('failed')
+        logger.exception('Не удалось подготовить миниатюру поста %s', post_id)
+    finally:
+        close_old_connections()
+
+
+class ThumbnailPipeline:
+    """Очередь постов, обрабатываемая потоками поверх пула процессов."""
+
+    def __init__(self, workers=None):
+        self.workers = workers or settings.THUMBNAIL_WORKERS
+        self.queue = queue.Queue()
+        self.pool = None
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def _start(self):
+        with self.lock:
+            if self.pool is not None:
+                return
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            for _ in range(self.workers):
+                thread = threading.Thread(target=self._work, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def _render(self, data):
+        return self.pool.submit(render_thumbnail, data).result()
+
+    def _work(self):
+        while True:
+            post_id = self.queue.get()
+            try:
+                _process(post_id, render=self._render)
+            finally:
+                self.queue.task_done()
+
+    def submit(self, post_id):
+        self._start()
+        self.queue.put(post_id)
+
+    def join(self):
+        self.queue.join()
+
+
+pipeline = ThumbnailPipeline()
+
+
+def schedule(post):
+    """Поставить пост в очередь после фиксации транзакции."""
+    if not post.image:
+        return
+    if settings.THUMBNAIL_ASYNC:
+        transaction.on_commit(lambda: pipeline.submit(post.pk))
+    else:
+        transaction.on_commit(lambda: generate(post.pk))
+
+
+def _missing():
+    return Post.objects.exclude(image='').filter(thumbnail_url='')
+
+
+def backfill(post_ids=None, batch_size=500):
+    """Подготовить миниатюры постам с картинкой, у которых их нет.
+
+    ``post_ids`` ограничивает проверку этими постами. Возвращает, сколько
+    постов обработано и у скольких миниатюры так и не появилось.
+    """
+    if post_ids is None:
+        ids = list(_missing().values_list('pk', flat=True))
+    else:
+        post_ids, ids = list(post_ids), []
+        for start in range(0, len(post_ids), batch_size):
+            ids.extend(
+                _missing()
+                .filter(pk__in=post_ids[start:start + batch_size])
+                .values_list('pk', flat=True)
+            )
+    for post_id in ids:
+        if settings.THUMBNAIL_ASYNC:
+            pipeline.submit(post_id)
+        else:
+            _process(post_id)
+    pipeline.join()
+    failed = sum(
+        _missing().filter(pk__in=ids[start:start + batch_size]).count()
+        for start in range(0, len(ids), batch_size)
+    )
+    return len(ids), failed
@@ -1,21 +1,40 @@
-from core import utils
+from core import http, utils
+from core.instrumentation import query_budget
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse, QueryDict
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
-
+from django.urls import reverse
+
+from . import (
+    caching,
+    cards,
+    counters,
+    feed,
+    freshness,
+    search,
+    thumbnails,
+)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Post, User
 
 
-@cache_page(20, key_prefix='index_page')
+@query_budget(5)
+@http.conditional(freshness.index)
+@caching.cache_listing(caching.INDEX_SCOPE)
 def index(request):
     template = 'posts/index.html'
     posts = Post.objects.select_related('author', 'group').all()
-    page_obj = utils.get_page_from_paginator(request, posts)
+    page_obj = utils.get_page_from_paginator(
+        request,
+        posts,
+        count=caching.get_listing_count(caching.INDEX_SCOPE, posts),
+    )
     context = {'page_obj': page_obj}
     return render(request, template, context)
 
 
+@query_budget(14)
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
@@ -27,31 +46,40 @@ def post_create(request):
         new_post = form.save(commit=False)
         new_post.author = user
         new_post.save()
+        thumbnails.schedule(new_post)
         return redirect('posts:profile', user.username)
 
     return render(request, template, context)
 
 
+@query_budget(18)
 @login_required
 def post_edit(request, post_id):
     template = 'posts/create_post.html'
-    post = get_object_or_404(Post, pk=post_id)
+    # автор нужен сигналам сброса кеша после сохранения
+    post = get_object_or_404(Post.objects.select_related('author'), pk=post_id)
     user = request.user
     form = PostForm(
         request.POST or None, files=request.FILES or None, instance=post
     )
     context = {'is_edit': True, 'post_id': post_id, 'form': form}
 
-    if post.author.username != user.username:
+    if post.author_id != user.pk:
         return redirect('posts:post_detail', post_id)
 
     if form.is_valid():
+        if 'image' in form.changed_data:
+            post.thumbnail_url = ''
+        cards.forget(post)
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id)
 
     return render(request, template, context)
 
 
+@query_budget(6)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
@@ -65,11 +93,18 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(5)
+@http.conditional(freshness.group_posts)
+@caching.cache_listing(caching.group_scope)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
+    group = caching.get_group(slug)
+    if group is None:
+        raise Http404
     posts = group.posts.select_related('author').all()
-    page_obj = utils.get_page_from_paginator(request, posts)
+    page_obj = utils.get_page_from_paginator(
+        request, posts, count=caching.limit_count(group.posts_count)
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -77,53 +112,135 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@query_budget(6)
+@http.conditional(freshness.profile)
+@caching.cache_listing(caching.profile_scope)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    user = request.user
-    following = False
-    if user.is_authenticated:
-        following = author.following.filter(user=user).exists()
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username
+    )
+    # кнопка подписки - персональный фрагмент, тело страницы общее
     posts = author.posts.select_related('group').all()
-    page_obj = utils.get_page_from_paginator(request, posts)
+    page_obj = utils.get_page_from_paginator(
+        request,
+        posts,
+        count=caching.limit_count(counters.for_user(author).posts_count),
+    )
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+def get_comments_page(request, post_id):
+    """Порция комментариев поста после курсора ``?after=``."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    )
+    return utils.get_page_from_cursor(
+        request,
+        comments,
+        settings.COMMENTS_PER_PAGE,
+        keys=('-created', '-pk'),
+    )
+
+
+@query_budget(5)
+@http.conditional(freshness.post_detail)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.select_related('author').all()
-    form = CommentForm()
-    context = {'post': post, 'comments': comments, 'form': form}
+    # пост, автор, группа и счётчик постов автора - одним запросом,
+    # комментарии с авторами - вторым
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'), pk=post_id
+    )
+    counters.for_user(post.author)
+    comments = get_comments_page(request, post.pk)
+    # форма комментария - персональный фрагмент, см. posts.fragments
+    context = {'post': post, 'comments': comments}
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(2)
+def post_comments(request, post_id):
+    """Следующая порция комментариев: HTML-фрагмент или JSON."""
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = get_comments_page(request, post_id)
+    wants_json = (
+        request.GET.get('format') == 'json'
+        or 'application/json' in request.META.get('HTTP_ACCEPT', '')
+    )
+    if not wants_json:
+        context = {'post_id': post_id, 'comments': comments}
+        return render(request, 'posts/includes/comments.html', context)
+
+    next_url = None
+    if comments.has_next():
+        next_url = '{}?{}={}&format=json'.format(
+            reverse('posts:post_comments', args=(post_id,)),
+            utils.AFTER_PARAM,
+            comments.next_cursor,
+        )
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.pk,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created.isoformat(),
+            }
+            for comment in comments
+        ],
+        'next_cursor': comments.next_cursor,
+        'next': next_url,
+    })
+
+
+@query_budget(4)
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    posts = search.search(query).select_related('author', 'group')
+    # порядок по релевантности, курсор по дате к нему не подходит
+    page_obj = utils.get_page_from_paginator(
+        request, posts, mode=utils.PAGE_MODE
+    )
+    page_query = QueryDict(mutable=True)
+    page_query['q'] = query
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': page_query.urlencode() + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(5)
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = utils.get_page_from_paginator(request, posts)
+    posts = feed.get_feed(request.user)
+    count = caching.get_listing_count(
+        caching.feed_scope(request.user.pk),
+        posts,
+        timeout=settings.FEED_COUNT_TIMEOUT,
+    )
+    page_obj = utils.get_page_from_paginator(request, posts, count=count)
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
 
+@query_budget(13)
 @login_required
 def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
-    do_already_follow = user.follower.filter(author=author).exists()
-    if user.username != username and not do_already_follow:
-        Follow.objects.create(user=user, author=author)
+    if user != author:
+        Follow.objects.get_or_create(user=user, author=author)
     return redirect('posts:profile', username)
 
 
+@query_budget(9)
 @login_required
 def profile_unfollow(request, username):
-    user = request.user
     author = get_object_or_404(User, username=username)
-    do_follow = user.follower.filter(author=author).exists()
-    if do_follow:
-        request.user.follower.filter(author=author).delete()
+    request.user.follower.filter(author=author).delete()
     return redirect('posts:profile', username)
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import hashlib
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -38,6 +40,42 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 # Application definition
 
 POSTS_PER_PAGE = 10
+# комментарии под постом подгружаются порциями по курсору
+COMMENTS_PER_PAGE = 20
+# 'page' - номера страниц, 'cursor' - курсорная пагинация (?after=)
+PAGINATION_MODE = 'page'
+# ленты сбрасываются сигналами моделей, срок жизни может быть долгим
+LISTING_CACHE_TIMEOUT = 60 * 60
+# после срока страница ещё столько отдаётся, пока обновляется в фоне
+LISTING_STALE_TIMEOUT = 60 * 10
+# блокировка пересчёта страницы и опрос её держателя остальными
+LISTING_LOCK_TIMEOUT = 10
+LISTING_LOCK_POLL = 0.05
+# 1 - обычная доля раннего пересчёта XFetch, больше - раньше
+LISTING_EARLY_EXPIRY_BETA = 1.0
+LISTING_REFRESH_WORKERS = 2
+# 'exact' - COUNT(*) кешируется до записи в ленту; 'approximate' -
+# для общей ленты число из статистики таблицы, страниц в любой ленте
+# не больше LISTING_MAX_PAGES
+LISTING_COUNT_MODE = 'exact'
+LISTING_MAX_PAGES = 1000
+# версии лент берутся из часов, поэтому истекать им безопасно
+LISTING_VERSION_TIMEOUT = 60 * 60 * 24
+# карточка поста меняет ключ при правке поста и имени автора
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+# лента подписок: сколько постов хранить на читателя и начиная с какого
+# числа подписчиков посты автора не раскладываются по лентам при записи
+FEED_MAX_ITEMS = 1000
+FEED_FANOUT_LIMIT = 10000
+FEED_CELEBRITIES_TIMEOUT = 60 * 5
+# посты авторов сбрасывают число постов в ленте читателя только
+# по истечении срока, подписка и отписка - сразу
+FEED_COUNT_TIMEOUT = 60
+
+# миниатюры картинок готовятся в фоне после сохранения поста
+THUMBNAIL_ASYNC = True
+THUMBNAIL_WORKERS = 2
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -54,18 +92,48 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryStatsMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
+    'core.middleware.LocalCacheSyncMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.PersonalFragmentsMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# сколько одинаковых SQL за запрос считать признаком N+1
+QUERY_DUPLICATE_THRESHOLD = 3
+# превышение бюджета запросов view: исключение вместо записи в лог
+QUERY_BUDGET_RAISE = False
+
+# каталог, через который воркеры складывают метрики для /metrics;
+# без него /metrics показывает только свой процесс
+METRICS_DIR = os.getenv('YATUBE_METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 1
+
+# статистика запросов пишется JSON-строками в лог yatube.queries,
+# на уровне INFO - по каждому запросу, на WARNING - только проблемы
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {
+        'yatube.queries': {
+            'handlers': ['console'],
+            'level': os.getenv('YATUBE_QUERY_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
@@ -81,6 +149,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.timeouts.timeouts',
             ],
         },
     },
@@ -97,15 +166,72 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.getenv(
+            'YATUBE_DB_PATH', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
     }
 }
 
+# Реплики только для чтения: YATUBE_DB_REPLICAS - пути через запятую,
+# алиасы replica1, replica2... Без реплик всё читается из default.
+# В тестах реплики смотрят в тестовую default.
+REPLICA_DATABASES = []
+_replica_paths = os.getenv('YATUBE_DB_REPLICAS', '').split(',')
+for _number, _path in enumerate(filter(None, _replica_paths), start=1):
+    DATABASES[f'replica{_number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': _path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(f'replica{_number}')
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# после записи клиент столько секунд читает из default,
+# время должно перекрывать отставание реплик
+REPLICA_PIN_COOKIE = 'primary_pin'
+REPLICA_PIN_SECONDS = 5
+
+# Общий для всех воркеров кеш: страницы, KV-хранилище sorl и сессии.
+# YATUBE_CACHE_BACKEND: file (по умолчанию), memcached или locmem -
+# последний годится только для одного процесса. Каталог файлового кеша
+# свой у каждой копии проекта, тесты получают отдельный на каждый запуск
+# (core.testing.IsolatedCacheRunner, для pytest - conftest.py).
+CACHE_BACKENDS = {
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+CACHE_DEFAULT_LOCATIONS = {
+    'file': os.path.join(
+        tempfile.gettempdir(),
+        'yatube_cache_' + hashlib.md5(BASE_DIR.encode()).hexdigest()[:8],
+    ),
+    'memcached': '127.0.0.1:11211',
+    'locmem': 'yatube',
+}
+CACHE_BACKEND = os.getenv('YATUBE_CACHE_BACKEND', 'file')
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.getenv(
+            'YATUBE_CACHE_LOCATION', CACHE_DEFAULT_LOCATIONS[CACHE_BACKEND]
+        ),
     }
 }
+if CACHE_BACKEND != 'memcached':
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+
+# локальный уровень перед общим кешем, см. core.cache
+LOCAL_CACHE_MAX_BYTES = 32 * 1024 * 1024
+LOCAL_CACHE_TIMEOUT = 5
+LOCAL_CACHE_SYNC_INTERVAL = 1
+# сколько пропущенных рассылок процесс разбирает по ключам, а не
+# очищает память целиком
+LOCAL_CACHE_MAX_CHANGES = 100
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+TEST_RUNNER = 'core.testing.IsolatedCacheRunner'
+THUMBNAIL_CACHE = 'default'
 
 
 # Password validation